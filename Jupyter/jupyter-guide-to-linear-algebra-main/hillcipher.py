@@ -7,52 +7,163 @@ Created on Nov 5 12:07:23 2020
 The purpose of this module is to contain the code that is used for the 
 Hill Cipher application in the Jupyter Guide to Linear Algebra.
 """
+import copy
+import math
 import numpy as np
 import laguide as lag
 import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 letter_list =' .?ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 alphabet = []
 for letter in letter_list:
     alphabet.append(letter)
 
-def AlphaMessage_to_NumericMessage(msg):
+class Alphabet:
+    '''
+    Alphabet(symbols = letter_list, ignore_case = True, unsupported = 'count')
+    
+    Alphabet of N symbols for the Hill Cipher, which are given the values 0
+    to N-1 in order.  symbols is a string of distinct characters with codes
+    less than 256, or bytes.  Messages are translated with lookup tables of
+    256 entries indexed by byte values: encode gives the value of each byte,
+    or -1 if it is not a symbol, and decode gives the byte of each value.
+    Strings are converted to bytes with ASCII if all of the symbols are 
+    ASCII characters, and with Latin-1 otherwise.  If ignore_case is True, 
+    lower case letters are given the values of the upper case symbols.
+    
+    Characters that are not symbols are handled by the policy unsupported.
+    
+    'drop': They are left out of the message.
+    'count': They are left out, and their number is added to skipped.
+    'error': ValueError is raised.
+    
+    default_alphabet holds the letters of alphabet, and byte_alphabet has 
+    all 256 byte values as symbols, so that any bytes can be encrypted.
+
+    Attributes
+    ----------
+    symbols : bytes
+    N : int, number of symbols
+    encode : NumPy array object of dimension 256 with dtype int16
+    decode : NumPy array object of dimension N with dtype uint8
+    encoding : string, 'ascii' or 'latin-1'
+    unsupported : string
+    skipped : int, number of characters left out with 'count'
+    '''
+    
+    def __init__(self, symbols = letter_list, ignore_case = True, 
+                 unsupported = 'count'):
+        if (isinstance(symbols,str)):
+            symbols = symbols.encode('latin-1')
+        if (len(set(symbols)) != len(symbols)):
+            raise ValueError("Symbols of an alphabet must be distinct.")
+        if (unsupported not in ('drop','count','error')):
+            raise ValueError("Policy for unsupported characters must be "
+                             "'drop', 'count' or 'error'.")
+        
+        self.symbols = bytes(symbols)
+        self.N = len(self.symbols)
+        self.unsupported = unsupported
+        self.skipped = 0
+        if (max(self.symbols) < 128):
+            self.encoding = 'ascii'
+        else:
+            self.encoding = 'latin-1'
+        
+        self.encode = np.full(256,-1,dtype=np.int16)
+        self.decode = np.frombuffer(self.symbols,dtype=np.uint8)
+        self.encode[self.decode] = np.arange(self.N)
+        if (ignore_case):
+            for i, symbol in enumerate(self.symbols):
+                lower = ord(chr(symbol).lower())
+                if (lower < 256 and self.encode[lower] < 0):
+                    self.encode[lower] = i
+    
+    def Bytes(self, msg):
+        '''
+        Bytes(msg)
+        
+        Bytes returns msg as an array of bytes, and the number of characters
+        of msg that could not be converted.  These are only possible if msg
+        is a string.
+        '''
+        if (isinstance(msg,str)):
+            data = msg.encode(self.encoding,errors='ignore')
+            return np.frombuffer(data,dtype=np.uint8), len(msg) - len(data)
+        return np.frombuffer(msg,dtype=np.uint8), 0
+    
+    def Unsupported(self, count):
+        '''
+        Unsupported(count)
+        
+        Unsupported applies the policy for unsupported characters to count
+        characters that were left out of a message.
+        '''
+        if (count == 0 or self.unsupported == 'drop'):
+            return
+        if (self.unsupported == 'error'):
+            raise ValueError("%d characters are not included in the "
+                             "alphabet." % count)
+        self.skipped += count
+    
+    def Values(self, msg):
+        '''
+        Values(msg)
+        
+        Values returns the values of the characters of msg that are symbols,
+        as an array with dtype int16.  Other characters are handled by the 
+        policy for unsupported characters.
+        '''
+        data, missing = self.Bytes(msg)
+        values = self.encode[data]
+        keep = (values >= 0)
+        if (missing == 0 and np.all(keep)):
+            return values
+        self.Unsupported(missing + np.count_nonzero(~keep))
+        return values[keep]
+
+default_alphabet = Alphabet(letter_list)
+byte_alphabet = Alphabet(bytes(range(256)),ignore_case=False)
+
+def AlphaMessage_to_NumericMessage(msg, symbols = None):
     ''' 
-    AlphaMessage_to_NumericMessage(msg)
+    AlphaMessage_to_NumericMessage(msg, symbols = None)
     
     Translates a string to a list of values, based on the indices of the 
-    alphabet contained in this module.  Returns a list.  Any characters in
-    the string that are not in the alphabet are not included in the list.
+    Alphabet symbols, or default_alphabet if it is not given.  Returns a 
+    list.  Any characters in the string that are not in the alphabet are 
+    not included in the list, and are handled by the policy of the 
+    Alphabet.  With default_alphabet they are counted in its skipped.
 
     Parameters
     ----------
     msg : String
+    symbols : optional Alphabet
     
     Returns
     -------
     plaintext: List containing ints
     '''
-    plaintext = []
+    if (symbols is None):
+        symbols = default_alphabet
     
-    for char in msg.upper():
-        if (char in alphabet):
-            plaintext.append(alphabet.index(char))
-        else:
-            print(char,"is not included in the current alphabet.")
+    return symbols.Values(msg).tolist()
 
-    return plaintext
 
-
-def CheckEncryptionMatrix(A):
+def CheckEncryptionMatrix(A, N = None):
     '''
-    CheckEncryptionMatrix(A)
+    CheckEncryptionMatrix(A, N = None)
     
-    Determine if det A has an inverse mod N.  N is the length of the alphabet
-    contained in this module.
+    Determine if det A has an inverse mod N.  If N is not given, it is the
+    length of the alphabet contained in this module.
 
     Parameters
     ----------
     A: NumPy array object of dimension nxn
+    N: optional int
 
     Returns
     -------
@@ -63,13 +174,410 @@ def CheckEncryptionMatrix(A):
         print("Encryption matrix must be square.")
         return False
 
+    if (N is None):
+        N = len(alphabet)
+
     # Check if det A has inverse mod N
-    if (ModularInverse(lag.DeterminantIteration(A),len(alphabet))):
+    if (ModularInverse(lag.DeterminantIteration(A),N)):
         return True
     else:
         return False
 
 
+def CipherGroups(groups,decrypt):
+    '''
+    CipherGroups(groups,decrypt)
+    
+    CipherGroups encrypts, or decrypts if decrypt is True, each list of 
+    messages in groups with its HillCipher, using HillCipher.Batch.  It is
+    defined at the top level of the module so that HillCipherService can 
+    run it in other processes.
+
+    Parameters
+    ----------
+    groups: list of (HillCipher, list of strings or bytes) tuples
+    decrypt: bool
+
+    Returns
+    -------
+    outputs: list of (list of strings or bytes, int) tuples, the results 
+        and number of unsupported characters for each group
+    '''
+    outputs = []
+    for cipher, messages in groups:
+        if (decrypt):
+            outputs.append(cipher.Batch(messages,cipher.A_inv))
+        else:
+            outputs.append(cipher.Batch(messages,cipher.A%cipher.N))
+    return outputs
+
+
+def ExtendedGCD(a,b):
+    '''
+    ExtendedGCD(a,b)
+    
+    ExtendedGCD returns the greatest common divisor g of the integers a and
+    b, along with integers x and y such that ax + by = g.
+
+    Parameters
+    ----------
+    a: int
+    b: int
+
+    Returns
+    -------
+    g: int
+    x: int
+    y: int
+    '''
+    x_old, x = 1, 0
+    y_old, y = 0, 1
+    while (b != 0):
+        q = a//b
+        a, b = b, a - q*b
+        x_old, x = x, x_old - q*x
+        y_old, y = y, y_old - q*y
+    return a, x_old, y_old
+
+
+class HillCipher:
+    '''
+    HillCipher(A, symbols = None, rng = None)
+    
+    Hill Cipher with encryption matrix A and the Alphabet symbols, or 
+    default_alphabet if it is not given, for encrypting and decrypting 
+    long messages.  The key is checked with CheckEncryptionMatrix and its 
+    inverse mod N is computed with ModularInverseMatrix once, when the 
+    HillCipher is made, instead of on every message.  Characters are 
+    translated through lookup tables indexed by their byte values, and all
+    blocks of a message are multiplied by the key in a single matrix 
+    product, so the cost per character is small and grows linearly with the
+    length of the message.
+    
+    Encrypt and Decrypt accept a string or bytes and return the same type.
+    As in AlphaMessage_to_NumericMessage, characters not in the alphabet 
+    are handled by the policy of the Alphabet.  With byte_alphabet, any 
+    bytes can be encrypted, and N is 256.  The bytes processed and the 
+    time taken are added up, and Throughput reports the rate in MB/s.
+    
+    Messages are padded to a multiple of n with random values from rng, 
+    which may be a random.Random object.  By default the random module is
+    used, as in HillCipherEncryption.  Apply, Batch and Stream all pad 
+    through Padding, so seeding rng makes every result repeatable.
+    
+    Attributes
+    ----------
+    A : NumPy array object of dimension nxn
+    A_inv : NumPy array object of dimension nxn, inverse of A mod N
+    alphabet : Alphabet
+    N : int, number of symbols in the alphabet
+    rng : random.Random object used for padding, or None for the random 
+          module
+    valid : bool, False if A cannot be used with the alphabet
+    bytes : int, number of bytes processed
+    seconds : float, time spent processing them
+    '''
+    
+    def __init__(self, A, symbols = None, rng = None):
+        self.A = np.array(A,dtype=np.int64)
+        self.A_inv = None
+        self.alphabet = default_alphabet if symbols is None else symbols
+        self.N = self.alphabet.N
+        self.rng = rng
+        self.bytes = 0
+        self.seconds = 0.
+        self.valid = False
+        self.wrap = None
+        
+        if (self.A.ndim != 2 or self.A.shape[0] != self.A.shape[1]):
+            print("Encryption matrix must be square.")
+            return
+        if (CheckEncryptionMatrix(self.A,self.N) == False):
+            print("Encryption matrix is not compatible with current alphabet.")
+            return
+        self.A_inv = np.array(ModularInverseMatrix(self.A,self.N),dtype=np.int64)
+        self.valid = True
+    
+    def Apply(self, msg, M):
+        '''
+        Apply(msg, M)
+        
+        Apply translates msg to values, pads it with random values to a 
+        multiple of n, multiplies each block of n values by M mod N and 
+        translates the result back.  It is used by Encrypt with A and by 
+        Decrypt with A_inv.
+        '''
+        start = time.perf_counter()
+        n = M.shape[0]
+        
+        values = self.alphabet.Values(msg)
+        
+        # Pad message with random numbers
+        padding = (-len(values))%n
+        if (padding > 0):
+            values = np.concatenate((values,self.Padding(padding)))
+        text = self.Multiply(values,M)
+        
+        self.bytes += len(msg)
+        self.seconds += time.perf_counter() - start
+        if (isinstance(msg,str)):
+            return text.decode(self.alphabet.encoding)
+        return text
+    
+    def Batch(self, messages, M):
+        '''
+        Batch(messages, M)
+        
+        Batch applies M to each message in the list messages, as Apply 
+        does, but with a single lookup and matrix product for all of them.
+        Each message is padded separately.  It returns the list of results 
+        and the number of characters that are not in the alphabet, which 
+        are left out.  The policy of the Alphabet is not applied to them, 
+        since Batch may run in another process, so the caller applies it.
+        '''
+        n = M.shape[0]
+        count = len(messages)
+        if (count == 0):
+            return [], 0
+        
+        # All messages are translated at once, with message[i] giving the 
+        # message that each byte belongs to
+        skipped = 0
+        encoded = []
+        for msg in messages:
+            data, missing = self.alphabet.Bytes(msg)
+            encoded.append(data)
+            skipped += missing
+        lengths = np.array([len(data) for data in encoded])
+        data = np.concatenate(encoded)
+        message = np.repeat(np.arange(count),lengths)
+        values = self.alphabet.encode[data]
+        
+        keep = (values >= 0)
+        if (not np.all(keep)):
+            skipped += int(np.count_nonzero(~keep))
+            values = values[keep]
+            message = message[keep]
+        
+        # Each message is padded with random numbers to a multiple of n, and
+        # its values are placed at the start of its padded range
+        counts = np.bincount(message,minlength=count)
+        padded = counts + (-counts)%n
+        padded_starts = np.cumsum(padded) - padded
+        starts = np.cumsum(counts) - counts
+        positions = (padded_starts[message] + np.arange(len(values)) - 
+                     starts[message])
+        P = np.zeros(padded.sum(),dtype=np.int64)
+        filled = np.zeros(len(P),dtype=bool)
+        P[positions] = values
+        filled[positions] = True
+        P[~filled] = self.Padding(len(P)-len(values))
+        text = self.Multiply(P,M)
+        
+        results = []
+        for msg, start, length in zip(messages,padded_starts.tolist(),
+                                      padded.tolist()):
+            result = text[start:start+length]
+            if (isinstance(msg,str)):
+                result = result.decode(self.alphabet.encoding)
+            results.append(result)
+        return results, skipped
+    
+    def Decrypt(self, msg):
+        '''
+        Decrypt(msg)
+        
+        Decrypt decodes ciphertext msg generated with the same encryption 
+        matrix, as in HillCipherDecryption.
+
+        Parameters
+        ----------
+        msg: String or bytes
+
+        Returns
+        -------
+        decrypted_message: String or bytes
+        '''
+        if (not self.valid):
+            print("Encryption not applied.")
+            return msg
+        return self.Apply(msg,self.A_inv)
+    
+    def DecryptStream(self, source, target = None, chunk_size = 2**20):
+        '''
+        DecryptStream(source, target = None, chunk_size = 2**20)
+        
+        DecryptStream decodes ciphertext that is read in chunks, as 
+        described in EncryptStream.
+
+        Parameters
+        ----------
+        source: iterable of strings or bytes, or file object
+        target: optional file object
+        chunk_size: optional int
+
+        Returns
+        -------
+        chunks: iterator of strings or bytes, only if target is None
+        '''
+        if (not self.valid):
+            print("Encryption not applied.")
+            return None
+        chunks = self.Stream(source,self.A_inv,chunk_size)
+        if (target is None):
+            return chunks
+        for chunk in chunks:
+            target.write(chunk)
+    
+    def Encrypt(self, msg):
+        '''
+        Encrypt(msg)
+        
+        Encrypt applies Hill Cipher encryption to the plaintext msg, as in 
+        HillCipherEncryption.
+
+        Parameters
+        ----------
+        msg: String or bytes
+
+        Returns
+        -------
+        encrypted_message: String or bytes
+        '''
+        if (not self.valid):
+            print("Encryption not applied.")
+            return msg
+        return self.Apply(msg,self.A%self.N)
+    
+    def EncryptStream(self, source, target = None, chunk_size = 2**20):
+        '''
+        EncryptStream(source, target = None, chunk_size = 2**20)
+        
+        EncryptStream applies Hill Cipher encryption to a message that is 
+        too long to hold in memory.  source is an iterable of strings or 
+        bytes, or a file object that is read chunk_size characters at a 
+        time.  The values left over at the end of a chunk, fewer than n, 
+        are carried over to the next one, and only the end of the message 
+        is padded, so the ciphertext is the same as from Encrypt on the 
+        whole message.  If target is None, an iterator of ciphertext chunks
+        is returned.  Otherwise each chunk is written to target as soon as 
+        it is ready.  Either way only one chunk at a time is held in memory.
+
+        Parameters
+        ----------
+        source: iterable of strings or bytes, or file object
+        target: optional file object
+        chunk_size: optional int
+
+        Returns
+        -------
+        chunks: iterator of strings or bytes, only if target is None
+        '''
+        if (not self.valid):
+            print("Encryption not applied.")
+            return None
+        chunks = self.Stream(source,self.A%self.N,chunk_size)
+        if (target is None):
+            return chunks
+        for chunk in chunks:
+            target.write(chunk)
+    
+    def Multiply(self, values, M):
+        '''
+        Multiply(values, M)
+        
+        Multiply multiplies each block of n values by M mod N and returns 
+        the letters of the result as bytes.  The number of values must be a
+        multiple of n.
+        '''
+        n = M.shape[0]
+        N = self.N
+        decode = self.alphabet.decode
+        
+        # Each row of P is a block, so all blocks are multiplied at once by
+        # P@M^T.  The entries of M are reduced mod N, so the products are at
+        # most n(N-1)^2.  The matrix product is fastest with floats, and 
+        # float32 is used when the products are exact in it.
+        largest = n*(N-1)**2
+        if (largest < 2**24):
+            dtype = np.float32
+        else:
+            dtype = np.float64
+        P = values.reshape((-1,n)).astype(dtype)
+        C = (P@M.transpose().astype(dtype)).astype(np.int64).ravel()
+        
+        # wrap gives the letter for each possible product, so reducing mod N
+        # and translating back are a single lookup
+        if (largest < 2**22):
+            if (self.wrap is None or len(self.wrap) <= largest):
+                self.wrap = decode[np.arange(largest+1)%N]
+            return self.wrap[C].tobytes()
+        return decode[C%N].tobytes()
+    
+    def Padding(self, count):
+        '''
+        Padding(count)
+        
+        Padding returns an array of count random values from 0 to N-1, 
+        drawn from rng.  It is used to pad messages to a multiple of n.
+        '''
+        rng = random if self.rng is None else self.rng
+        return np.array([rng.randrange(self.N) for i in range(count)],
+                        dtype=np.int64)
+    
+    def Stream(self, source, M, chunk_size = 2**20):
+        '''
+        Stream(source, M, chunk_size = 2**20)
+        
+        Stream is the generator used by EncryptStream with A and by 
+        DecryptStream with A_inv.  It yields the result for each chunk of 
+        source, of the same type as the chunk.
+        '''
+        n = M.shape[0]
+        
+        if (hasattr(source,'read')):
+            read = source.read
+            source = iter(lambda: read(chunk_size),read(0))
+        
+        leftover = np.zeros(0,dtype=self.alphabet.encode.dtype)
+        as_text = False
+        for chunk in source:
+            start = time.perf_counter()
+            as_text = isinstance(chunk,str)
+            values = self.alphabet.Values(chunk)
+            if (len(leftover) > 0):
+                values = np.concatenate((leftover,values))
+            
+            # Whole blocks are processed now, the rest are kept for the next
+            # chunk
+            whole = len(values) - len(values)%n
+            leftover = values[whole:]
+            text = self.Multiply(values[:whole],M)
+            
+            self.bytes += len(chunk)
+            self.seconds += time.perf_counter() - start
+            if (len(text) > 0):
+                yield text.decode(self.alphabet.encoding) if as_text else text
+        
+        # Pad the end of the message with random numbers
+        if (len(leftover) > 0):
+            padding = self.Padding(n-len(leftover))
+            text = self.Multiply(np.concatenate((leftover,padding)),M)
+            yield text.decode(self.alphabet.encoding) if as_text else text
+    
+    def Throughput(self):
+        '''
+        Throughput()
+        
+        Throughput returns the number of MB of messages processed by 
+        Encrypt and Decrypt per second.
+        '''
+        if (self.seconds == 0):
+            return 0.
+        return self.bytes/self.seconds/1e6
+
+
+
 def HillCipherEncryption(msg,A):
     '''
     HillCipherEncryption(msg,A)
@@ -178,11 +686,207 @@ def HillCipherDecryption(msg,A):
     return decrypted_message
 
 
+class HillCipherService:
+    '''
+    HillCipherService(max_keys = 1024, workers = 1, pool_bytes = 2**22,
+                      symbols = None)
+    
+    Encrypts and decrypts batches of many short messages under a number of
+    keys, with the Alphabet symbols, or default_alphabet if it is not 
+    given.  Characters not in the alphabet are handled by its policy once 
+    for each batch.  Keys are registered with AddKey under a key id, and 
+    each batch is a list of (message, key id) pairs.
+    
+    The HillCipher for each key, which holds the checked key and its 
+    inverse mod N, is kept in an LRU cache of up to max_keys entries, 
+    keyed by the bytes of the key.  Keys that are used again are not 
+    checked or inverted again, and the least recently used HillCipher is
+    dropped when the cache is full.  Within a batch, the messages are 
+    grouped by key and each group is processed with a single matrix 
+    product by HillCipher.Batch.  If workers is more than 1 and a batch 
+    holds at least pool_bytes of messages, the groups are divided among a
+    pool of that many processes.  Each group sent to the pool is padded 
+    with its own random.Random, seeded from the rng of its HillCipher, so
+    the processes do not repeat each other's padding.
+    
+    After each batch, a dictionary of counts and timings is added to 
+    stats: the number of messages, bytes, keys, cache hits and misses, the
+    seconds taken and the throughput in MB/s.
+    
+    Attributes
+    ----------
+    alphabet : Alphabet
+    keys : dictionary of key arrays by key id
+    ciphers : OrderedDict of HillCipher objects by key bytes
+    stats : list of dictionaries, one for each batch
+    '''
+    
+    def __init__(self, max_keys = 1024, workers = 1, pool_bytes = 2**22,
+                 symbols = None):
+        self.alphabet = default_alphabet if symbols is None else symbols
+        self.max_keys = max_keys
+        self.workers = workers
+        self.pool_bytes = pool_bytes
+        self.keys = {}
+        self.ciphers = OrderedDict()
+        self.stats = []
+        self.pool = None
+    
+    def AddKey(self, key_id, A):
+        '''
+        AddKey(key_id, A)
+        
+        AddKey registers the encryption matrix A under key_id.
+        '''
+        self.keys[key_id] = np.array(A,dtype=np.int64)
+    
+    def Cipher(self, key_id):
+        '''
+        Cipher(key_id)
+        
+        Cipher returns the HillCipher for the key registered as key_id, 
+        from the cache if it is there, and whether it was.
+        '''
+        A = self.keys[key_id]
+        key = A.tobytes() + bytes(str(A.shape),'ascii')
+        if (key in self.ciphers):
+            self.ciphers.move_to_end(key)
+            return self.ciphers[key], True
+        
+        cipher = HillCipher(A,self.alphabet)
+        self.ciphers[key] = cipher
+        if (len(self.ciphers) > self.max_keys):
+            self.ciphers.popitem(last=False)
+        return cipher, False
+    
+    def Close(self):
+        '''
+        Close()
+        
+        Close shuts down the pool of processes, if one was started.
+        '''
+        if (self.pool is not None):
+            self.pool.shutdown()
+            self.pool = None
+    
+    def DecryptBatch(self, pairs):
+        '''
+        DecryptBatch(pairs)
+        
+        DecryptBatch decodes each ciphertext message in pairs, a list of 
+        (message, key id) tuples, with the inverse of its key.
+
+        Parameters
+        ----------
+        pairs: list of (string or bytes, key id) tuples
+
+        Returns
+        -------
+        results: list of strings or bytes, in the order of pairs
+        '''
+        return self.Run(pairs,True)
+    
+    def EncryptBatch(self, pairs):
+        '''
+        EncryptBatch(pairs)
+        
+        EncryptBatch applies Hill Cipher encryption to each message in 
+        pairs, a list of (message, key id) tuples, with its key.
+
+        Parameters
+        ----------
+        pairs: list of (string or bytes, key id) tuples
+
+        Returns
+        -------
+        results: list of strings or bytes, in the order of pairs
+        '''
+        return self.Run(pairs,False)
+    
+    def Run(self, pairs, decrypt):
+        '''
+        Run(pairs, decrypt)
+        
+        Run groups the messages in pairs by key, processes the groups with 
+        CipherGroups and puts the results back in the order of pairs.  It 
+        is used by EncryptBatch and DecryptBatch.
+        '''
+        start = time.perf_counter()
+        results = [None]*len(pairs)
+        
+        # Positions of the messages for each key id
+        groups = OrderedDict()
+        for position, (msg, key_id) in enumerate(pairs):
+            groups.setdefault(key_id,[]).append(position)
+        
+        hits = 0
+        misses = 0
+        tasks = []
+        for key_id, positions in groups.items():
+            if (key_id not in self.keys):
+                print("Key",key_id,"is not registered.")
+                continue
+            cipher, cached = self.Cipher(key_id)
+            if (cached):
+                hits += 1
+            else:
+                misses += 1
+            if (not cipher.valid):
+                print("Encryption not applied for key",key_id,".")
+                for position in positions:
+                    results[position] = pairs[position][0]
+                continue
+            tasks.append((cipher,positions))
+        
+        work = [(cipher,[pairs[position][0] for position in positions])
+                for cipher, positions in tasks]
+        size = sum(len(msg) for msg, key_id in pairs)
+        if (self.workers > 1 and size >= self.pool_bytes and len(tasks) > 1):
+            if (self.pool is None):
+                self.pool = ProcessPoolExecutor(self.workers)
+            
+            # The processes start from copies of the same random state, so
+            # each group gets a copy of its cipher with a new seed
+            seeded = []
+            for cipher, messages in work:
+                rng = random if cipher.rng is None else cipher.rng
+                cipher = copy.copy(cipher)
+                cipher.rng = random.Random(rng.getrandbits(64))
+                seeded.append((cipher,messages))
+            work = seeded
+            
+            # A few slices of groups for each process, so that the cost of 
+            # sending them is shared by many groups
+            step = -(-len(work)//(4*self.workers))
+            futures = [self.pool.submit(CipherGroups,work[i:i+step],decrypt)
+                       for i in range(0,len(work),step)]
+            outputs = [output for future in futures for output in future.result()]
+        else:
+            outputs = CipherGroups(work,decrypt)
+        
+        skipped = 0
+        for (cipher, positions), (group_results, group_skipped) in zip(tasks,outputs):
+            skipped += group_skipped
+            for position, result in zip(positions,group_results):
+                results[position] = result
+        self.alphabet.Unsupported(skipped)
+        
+        seconds = time.perf_counter() - start
+        self.stats.append({'messages': len(pairs), 'bytes': size, 
+                           'keys': len(groups), 'hits': hits, 'misses': misses,
+                           'seconds': seconds, 
+                           'MB/s': size/seconds/1e6 if seconds > 0 else 0.})
+        return results
+
+
 def ModularInverse(a,N):
     '''
     ModularInverse(a,N)
     
-    ModularInverse finds the inverse of a, mod N, by direct search.
+    ModularInverse finds the inverse of a, mod N, with the extended 
+    Euclidean algorithm.  The number of steps grows with the number of 
+    digits of N.  If a has no inverse mod N, that is if a and N have a 
+    common factor, None is returned.
 
     Parameters
     ----------
@@ -193,23 +897,39 @@ def ModularInverse(a,N):
     -------
     i: int
     '''
-    for i in range(N):
-        if (i*a)%N == 1:
-            return i
+    # Keep r = s*a mod N for the last two remainders r
+    r_old, r = int(round(a))%N, N
+    s_old, s = 1, 0
+    while (r != 0):
+        q = r_old//r
+        r_old, r = r, r_old - q*r
+        s_old, s = s, s_old - q*s
+    
+    if (r_old != 1):
+        return None
+    return s_old%N
 
 
-def ModularInverseMatrix(A):
+def ModularInverseMatrix(A,N = None):
     '''
-    ModularInverseMatrix(A)
+    ModularInverseMatrix(A,N = None)
+    
+    ModularInverseMatrix computes the inverse of a matrix A mod N, with N 
+    being the length of the alphabet contained in this module if it is not
+    given.  The inverse is computed by Gauss-Jordan elimination on [A|I] 
+    with integers mod N, so it is exact and takes O(n^3) operations.  
     
-    ModularInverseMatrix computes the invers of a matrix A inverse mod N,
-    with N being the length of the alphabet contained in this module. The 
-    inverse matrix is computed with determinant formula and modular inverse 
-    of det A.
+    N need not be prime, so an entry may not have an inverse mod N even 
+    when it is not zero.  In each column a pivot with an inverse is used if
+    there is one.  If not, rows are combined as in the Euclidean algorithm
+    until the pivot is the greatest common divisor of the entries in the 
+    column.  If that has no inverse, then neither does A, and a message is 
+    printed and None is returned.
 
     Parameters
     ----------
     A: NumPy array object of dimension nxn
+    N: optional int
 
     Returns
     -------
@@ -219,32 +939,54 @@ def ModularInverseMatrix(A):
     if (A.shape[0] != A.shape[1]):
         print("Inverse matrices only defined for square arrays.")
         return
+    if (N is None):
+        N = len(alphabet)
     
     n = A.shape[0]  # n is number of rows and columns in A
     
-    A_inv = np.zeros((n,n),dtype='int')
-
-    det_A = lag.DeterminantIteration(A)
-    inv_det_A = ModularInverse(det_A,len(alphabet))
-
-    for i in range(n):
-        for j in range(n):
-            # Extract the Minor matrix
-            Minor = []
-            for k in range(n):
-                if (k != i):
-                    row = []
-                    for l in range(n):
-                        if (l != j):
-                            row.append(A[k,l])
-                    Minor.append(row)
-            Minor_array = np.array(Minor)
-
-            # Compute the (i,j) cofactor
-            cofactor = (-1)**(i+j)*lag.DeterminantIteration(Minor_array)
-            A_inv[j,i] = cofactor*inv_det_A
-
-    return A_inv
+    # Entries stay in the range 0 to N-1, so sums of two products fit in 
+    # int64 when N is less than 2^30.  Python ints are used for larger N.
+    if (N < 2**30):
+        dtype = np.int64
+    else:
+        dtype = object
+    W = np.zeros((n,2*n),dtype=dtype)
+    W[:,:n] = np.array(A,dtype=object)%N
+    W[:,n:] = np.eye(n,dtype=dtype)
+    
+    for k in range(n):
+        # Look for a pivot with an inverse mod N
+        pivot_inverse = None
+        for i in range(k,n):
+            if (W[i,k] != 0 and math.gcd(int(W[i,k]),N) == 1):
+                W[[k,i]] = W[[i,k]]
+                pivot_inverse = ModularInverse(W[k,k],N)
+                break
+        
+        # Otherwise combine rows k and i so that W[k,k] becomes the gcd of
+        # the two entries and W[i,k] becomes zero.  The combination has 
+        # determinant 1, so it can be undone mod N.
+        if (pivot_inverse is None):
+            for i in range(k+1,n):
+                if (W[i,k] == 0):
+                    continue
+                a, b = int(W[k,k]), int(W[i,k])
+                g, x, y = ExtendedGCD(a,b)
+                row_k = (x*W[k] + y*W[i])%N
+                W[i] = ((-(b//g))*W[k] + (a//g)*W[i])%N
+                W[k] = row_k
+            pivot_inverse = ModularInverse(W[k,k],N)
+            if (pivot_inverse is None):
+                print("Matrix is not invertible mod",N,".")
+                return None
+        
+        # Scale the pivot to 1 and create zeros above and below it
+        W[k] = (W[k]*pivot_inverse)%N
+        multipliers = W[:,k].copy()
+        multipliers[k] = 0
+        W = (W - np.outer(multipliers,W[k]))%N
+
+    return W[:,n:].copy()
 
 
 def NumericMessage_to_AlphaMessage(msg):
@@ -5,6 +5,7 @@ Created on Tue Nov 17 10:22:19 2020
 @author: Ben Vanderlei
 """
 
+import numpy as np
 import matplotlib.pyplot as plt
 import networkx as nx
 
@@ -24,13 +25,8 @@ def DrawGraph(A, pos = None):
     plt.figure(figsize=(6,6))
     G = nx.DiGraph()
     
-    N = A.shape[0]
-    edge_list = []
-    
-    for i in range(N):
-        for j in range(N):
-            if(A[i,j] == 1):
-                edge_list.append((i,j))
+    rows, cols = np.nonzero(np.asarray(A) == 1)
+    edge_list = list(zip(rows.tolist(),cols.tolist()))
     
     G.add_edges_from(edge_list)
     if (pos == None):
@@ -62,19 +58,12 @@ def HighlightSubgraph(A,pos,subgraph):
     plt.figure(figsize=(8,8))
     G = nx.DiGraph()
     
-    N = A.shape[0]
-    edge_list = []
-    subgraph_edges = []
-    
-    for i in range(N):
-        for j in range(N):
-            if(A[i,j] == 1):
-                edge_list.append((i,j))
- 
-    for edge in edge_list:           
-        if (edge[0] in subgraph and edge[1] in subgraph):
-                    subgraph_edges.append(edge)
+    rows, cols = np.nonzero(np.asarray(A) == 1)
+    edge_list = list(zip(rows.tolist(),cols.tolist()))
     
+    nodes = set(subgraph)
+    subgraph_edges = [edge for edge in edge_list 
+                      if edge[0] in nodes and edge[1] in nodes]
 
     G.add_edges_from(edge_list)
     
@@ -14,381 +14,2993 @@ inputs intended to represent vectors.
 Functions that have been tested have BSV in docstring.
 """
 
+import copy
+import functools
+import hashlib
+import inspect
 import math
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 
-def BackSubstitution(U,Y):
+# SciPy is only needed for sparse matrices
+try:
+    import scipy.sparse as sparse
+    import scipy.sparse.linalg as sparse_linalg
+except ImportError:
+    sparse = None
+
+# Numba is only needed for the 'numba' backend
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Backend used for the loops in Elimination, BackSubstitution and 
+# ForwardSubstitution, either 'numpy' or 'numba'.  The initial value can 
+# be set with the LAGUIDE_BACKEND environment variable, and it can be 
+# changed with SetBackend or for a single call with the backend argument.
+backend = os.environ.get('LAGUIDE_BACKEND','numpy')
+
+# Number of threads used for the tiled updates in BlockedElimination and 
+# QRFactorization.  The initial value can be set with the LAGUIDE_WORKERS
+# environment variable, and it can be changed with SetWorkers or for a 
+# single call with the workers argument.  The thread pools are created 
+# when first needed and kept in thread_pools, one for each size.
+workers = int(os.environ.get('LAGUIDE_WORKERS','1'))
+thread_pools = {}
+
+# Policy for the type of the entries in working copies made by the 
+# elimination routines, one of 'float64', 'preserve', 'mixed' or 'exact'
+# (see WorkingDtype).  The initial value can be set with the LAGUIDE_DTYPE
+# environment variable, and it can be changed with SetDtypePolicy or for a
+# single call with the dtype argument.
+dtype_policy = os.environ.get('LAGUIDE_DTYPE','float64')
+
+# ResultCache used by the functions decorated with Cached, or None when 
+# caching is off.  It is turned on with EnableCache.
+cache = None
+
+# Profile that is collecting counts, or None when profiling is off.  It is 
+# set while a Profile is used in a with statement.  The instrumented 
+# functions only check whether it is None, so there is no other cost when 
+# profiling is off.
+active_profile = None
+
+# Node positions computed by GraphLayout, keyed by a hash of the edges of 
+# the graph, so that drawing the same graph again reuses them.  Only the 
+# max_layouts most recently used are kept, and ClearLayouts removes them.
+layouts = OrderedDict()
+max_layouts = 32
+
+def Compiled(function):
     '''
-    BackSubstitution(U,Y)
+    Compiled(function)
+    
+    Compiled returns function compiled with Numba if it is installed, and 
+    function itself otherwise.  It is used as a decorator for the kernels
+    of the 'numba' backend, which are written as plain loops.
+    '''
+    if (numba is None):
+        return function
+    return numba.njit(cache=True)(function)
+
+def Cached(function):
+    '''
+    Cached(function)
+    
+    Cached is used as a decorator for functions whose results are worth 
+    keeping, such as Inverse, DeterminantIteration and QRFactorization.  
+    When caching has been turned on with EnableCache, the result for each
+    combination of arguments is stored in the ResultCache, and later calls
+    with the same arguments return a copy of it.  When caching is off, the
+    function is called directly.  Calls made inside laguide use the 
+    undecorated function, function.__wrapped__, so that only the calls made
+    by the user are stored.
+    '''
+    @functools.wraps(function)
+    def CachedFunction(*args, **kwargs):
+        if (cache is None):
+            return function(*args,**kwargs)
+        return cache.Call(function,args,kwargs)
+    return CachedFunction
+
+class ResultCache:
+    '''
+    ResultCache(max_bytes = 2**28, directory = None, max_disk_bytes = 2**30)
+    
+    Cache of function results, kept in least recently used order.  Results
+    are looked up by a key made with blake2b from the function name and the
+    arguments; for arrays, the shape, dtype and bytes of the entries are 
+    used, so equal arrays give the same key.  When the results in memory 
+    take more than max_bytes, the least recently used ones are removed.  If
+    directory is given, every result is also saved there with pickle, and 
+    results not found in memory are looked for on disk.  The files are 
+    also kept in least recently used order, by their modification times, 
+    and the oldest are deleted when they take more than max_disk_bytes.
+    
+    Files are read with pickle, which can run arbitrary code, so directory
+    must be one that only trusted users can write to.
+    
+    Calls with SciPy sparse matrices, np.memmap arrays or functions as 
+    arguments are not cached, and neither are results of None.  Calls that
+    are given an array to write their result in, with an argument named 
+    out, Q_out or workspace, are not cached either, since a stored result
+    would not be written there.
+    
+    Attributes
+    ----------
+    max_bytes : int
+    directory : string or None
+    max_disk_bytes : int
+    entries : OrderedDict of (result, bytes) by key
+    bytes : int, bytes of the results in memory
+    files : OrderedDict of file sizes by key
+    disk_bytes : int, bytes of the files in directory
+    hits, disk_hits, misses, evictions, disk_evictions : int
+    '''
+    
+    def __init__(self, max_bytes = 2**28, directory = None, 
+                 max_disk_bytes = 2**30):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.files = OrderedDict()
+        self.disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.lock = threading.Lock()
+        if (directory is not None):
+            os.makedirs(directory,exist_ok=True)
+            # Files left by earlier caches, oldest first
+            found = []
+            for name in os.listdir(directory):
+                if (name.endswith('.pkl')):
+                    info = os.stat(os.path.join(directory,name))
+                    found.append((info.st_mtime,name[:-4],info.st_size))
+            for mtime, key, size in sorted(found):
+                self.files[key] = size
+                self.disk_bytes += size
+            self.TrimDisk()
+    
+    def Key(self, function, args, kwargs):
+        '''
+        Key(function, args, kwargs)
+        
+        Key returns the hex digest that identifies a call, or None if the 
+        call cannot be cached.  The arguments are bound to the parameters of
+        function, with defaults filled in, so a call has the same key however
+        its arguments are given.  The dtype policy and backend are included,
+        since they can change the result.
+        '''
+        signature = inspect.signature(function)
+        try:
+            bound = signature.bind(*args,**kwargs)
+        except TypeError:
+            return None
+        bound.apply_defaults()
+        for name in ('out','Q_out','workspace'):
+            if (bound.arguments.get(name) is not None):
+                return None
+        
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(repr((function.__module__,function.__qualname__,
+                            dtype_policy,backend)).encode())
+        names = []
+        values = []
+        for name, value in bound.arguments.items():
+            kind = signature.parameters[name].kind
+            if (kind == inspect.Parameter.VAR_POSITIONAL):
+                names += [name]*len(value)
+                values += list(value)
+            elif (kind == inspect.Parameter.VAR_KEYWORD):
+                names += sorted(value)
+                values += [value[key] for key in sorted(value)]
+            else:
+                names.append(name)
+                values.append(value)
+        digest.update(repr(names).encode())
+        for value in values:
+            if (isinstance(value,np.memmap) or IsSparse(value) or callable(value)):
+                return None
+            if (isinstance(value,np.ndarray)):
+                digest.update(repr((value.shape,value.dtype.str)).encode())
+                if (value.dtype == object):
+                    digest.update(repr(value.tolist()).encode())
+                else:
+                    digest.update(np.ascontiguousarray(value).data)
+            else:
+                digest.update(repr(value).encode())
+        return digest.hexdigest()
+    
+    def Call(self, function, args, kwargs):
+        '''
+        Call(function, args, kwargs)
+        
+        Call returns a copy of the stored result of function(*args,**kwargs),
+        after computing and storing it if it is not found.
+        '''
+        key = self.Key(function,args,kwargs)
+        if (key is None):
+            return function(*args,**kwargs)
+        
+        with self.lock:
+            if (key in self.entries):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self.entries[key][0])
+        
+        if (self.directory is not None):
+            with self.lock:
+                found = key in self.files
+                if (found):
+                    self.files.move_to_end(key)
+            path = os.path.join(self.directory,key + '.pkl')
+            if (found and os.path.exists(path)):
+                with open(path,'rb') as file:
+                    result = pickle.load(file)
+                os.utime(path)
+                with self.lock:
+                    self.disk_hits += 1
+                self.Store(key,result,save=False)
+                return copy.deepcopy(result)
+        
+        with self.lock:
+            self.misses += 1
+        result = function(*args,**kwargs)
+        if (result is not None):
+            self.Store(key,copy.deepcopy(result))
+        return result
+    
+    def Store(self, key, result, save = True):
+        '''
+        Store(key, result, save = True)
+        
+        Store keeps result in memory, removing the least recently used 
+        results to stay within max_bytes, and saves it to the directory if
+        there is one and save is True.  A result larger than max_bytes is 
+        only saved to disk.
+        '''
+        if (save and self.directory is not None):
+            data = pickle.dumps(result)
+            if (len(data) <= self.max_disk_bytes):
+                with open(os.path.join(self.directory,key + '.pkl'),'wb') as file:
+                    file.write(data)
+                with self.lock:
+                    self.disk_bytes += len(data) - self.files.pop(key,0)
+                    self.files[key] = len(data)
+                self.TrimDisk()
+        
+        if (isinstance(result,tuple)):
+            size = sum(getattr(value,'nbytes',64) for value in result)
+        else:
+            size = getattr(result,'nbytes',64)
+        if (size > self.max_bytes):
+            return
+        with self.lock:
+            if (key in self.entries):
+                return
+            self.entries[key] = (result,size)
+            self.bytes += size
+            while (self.bytes > self.max_bytes):
+                old_key, (old_result, old_size) = self.entries.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+    
+    def Stats(self):
+        '''
+        Stats()
+        
+        Stats returns the counters of the cache as a dictionary.
+        '''
+        with self.lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self.entries), 'bytes': self.bytes,
+                    'max_bytes': self.max_bytes, 'files': len(self.files),
+                    'disk_bytes': self.disk_bytes, 
+                    'disk_evictions': self.disk_evictions}
+    
+    def TrimDisk(self):
+        '''
+        TrimDisk()
+        
+        TrimDisk deletes the least recently used files in the directory 
+        until they take no more than max_disk_bytes.
+        '''
+        while (True):
+            with self.lock:
+                if (self.disk_bytes <= self.max_disk_bytes or len(self.files) == 0):
+                    return
+                old_key, old_size = self.files.popitem(last=False)
+                self.disk_bytes -= old_size
+                self.disk_evictions += 1
+            try:
+                os.remove(os.path.join(self.directory,old_key + '.pkl'))
+            except FileNotFoundError:
+                pass
+
+class Profile:
+    '''
+    Profile(callback = None)
+    
+    Counts of the work done by laguide while the Profile is used in a with
+    statement:
+    
+        with Profile() as profile:
+            RowReduction(A)
+        profile.Print()
+    
+    The work is divided into phases such as 'copy', 'pivot search', 
+    'row swap', 'row scale', 'elimination', 'tolerance sweep' and 
+    'substitution'.  For each phase, the number of times it was entered, 
+    the time spent, the number of row operations, the floating point 
+    operations and the bytes copied into new arrays are added up.  If 
+    callback is given, it is called with the Report at the end of the with
+    statement.
+    
+    Attributes
+    ----------
+    phases : dictionary of counts by phase name
+    callback : function or None
+    '''
+    
+    def __init__(self, callback = None):
+        self.callback = callback
+        self.phases = {}
+        self.lock = threading.Lock()
+        self.previous = None
+    
+    def __enter__(self):
+        global active_profile
+        
+        self.previous = active_profile
+        active_profile = self
+        return self
+    
+    def __exit__(self, *exception):
+        global active_profile
+        
+        active_profile = self.previous
+        if (self.callback is not None):
+            self.callback(self.Report())
+        return False
+    
+    def Record(self, phase, mark, row_operations = 0, flops = 0, copied = 0):
+        '''
+        Record(phase, mark, row_operations = 0, flops = 0, copied = 0)
+        
+        Record adds the time since mark, a value of time.perf_counter, and 
+        the given counts to phase.  It returns a new mark for the next 
+        phase.
+        '''
+        now = time.perf_counter()
+        with self.lock:
+            counts = self.phases.setdefault(phase,{'calls': 0, 'seconds': 0., 
+                'row_operations': 0, 'flops': 0, 'bytes_copied': 0})
+            counts['calls'] += 1
+            counts['seconds'] += now - mark
+            counts['row_operations'] += int(row_operations)
+            counts['flops'] += int(flops)
+            counts['bytes_copied'] += int(copied)
+        return now
+    
+    def Report(self):
+        '''
+        Report()
+        
+        Report returns the counts for each phase, and their totals under 
+        'total', as a dictionary of dictionaries.
+        '''
+        with self.lock:
+            report = {phase: dict(counts) for phase, counts in self.phases.items()}
+        total = {'calls': 0, 'seconds': 0., 'row_operations': 0, 'flops': 0,
+                 'bytes_copied': 0}
+        for counts in report.values():
+            for name in total:
+                total[name] += counts[name]
+        report['total'] = total
+        return report
+    
+    def Print(self):
+        '''
+        Print()
+        
+        Print prints the Report as a table, with the phases that took the 
+        most time first.
+        '''
+        report = self.Report()
+        print("%-16s %8s %10s %12s %14s %14s" % ("phase","calls","seconds",
+              "row ops","flops","bytes copied"))
+        for phase in sorted(report,key=lambda phase: (phase == 'total',
+                                                      -report[phase]['seconds'])):
+            counts = report[phase]
+            print("%-16s %8d %10.4f %12d %14d %14d" % (phase,counts['calls'],
+                  counts['seconds'],counts['row_operations'],counts['flops'],
+                  counts['bytes_copied']))
+
+def EnableCache(max_bytes = 2**28, directory = None, max_disk_bytes = 2**30):
+    '''
+    EnableCache(max_bytes = 2**28, directory = None, max_disk_bytes = 2**30)
+    
+    EnableCache turns on caching of results for the functions decorated with
+    Cached, with a new ResultCache that keeps up to max_bytes of results in
+    memory and saves up to max_disk_bytes of them in directory if it is 
+    given.  The directory must be trusted, since its files are read with 
+    pickle.  No call sites need to change.
+
+    Parameters
+    ----------
+    max_bytes: optional int
+    directory: optional string
+    max_disk_bytes: optional int
+
+    Returns
+    -------
+    cache: ResultCache object
+    '''
+    global cache
+    
+    cache = ResultCache(max_bytes,directory,max_disk_bytes)
+    return cache
+
+def DisableCache():
+    '''
+    DisableCache()
+    
+    DisableCache turns off caching of results.  Files saved to disk are 
+    kept, and are used again by a later EnableCache with the same directory.
+
+    Returns
+    -------
+    None
+    '''
+    global cache
+    
+    cache = None
+
+def ActiveBackend(name = None):
+    '''
+    ActiveBackend(name = None)
+    
+    ActiveBackend returns the backend that will be used for a call with the
+    backend argument set to name.  If name is None, the module setting is
+    used.  'numba' falls back to 'numpy' when Numba is not installed.
+
+    Parameters
+    ----------
+    name: optional string, 'numpy' or 'numba'
+
+    Returns
+    -------
+    name: string
+    '''
+    if (name is None):
+        name = backend
+    if (name == 'numba' and numba is not None):
+        return 'numba'
+    return 'numpy'
+
+def ActiveDtypePolicy(name = None):
+    '''
+    ActiveDtypePolicy(name = None)
+    
+    ActiveDtypePolicy returns the dtype policy that will be used for a call 
+    with the dtype argument set to name.  If name is None, the module 
+    setting is used.
+
+    Parameters
+    ----------
+    name: optional string, 'float64', 'preserve', 'mixed' or 'exact'
+
+    Returns
+    -------
+    name: string
+    '''
+    if (name is None):
+        name = dtype_policy
+    return name
+
+def ActiveWorkers(count = None):
+    '''
+    ActiveWorkers(count = None)
+    
+    ActiveWorkers returns the number of threads that will be used for a call
+    with the workers argument set to count.  If count is None, the module 
+    setting is used.
+
+    Parameters
+    ----------
+    count: optional int
+
+    Returns
+    -------
+    count: int
+    '''
+    if (count is None):
+        count = workers
+    return max(1,int(count))
+
+def ApplyOperator(A, X):
+    '''
+    ApplyOperator(A, X)
+    
+    ApplyOperator computes the product AX for any of the forms of A used by
+    the iterative solvers: a NumPy array, a SciPy sparse matrix, or a 
+    function that accepts X and returns AX.  A function allows a matrix to
+    be used without ever storing its entries.
+
+    Parameters
+    ----------
+    A : NumPy array object, SciPy sparse matrix, or function
+    X : NumPy array object of dimension nx1
+
+    Returns
+    -------
+    AX: NumPy array object of dimension nx1
+    '''
+    if (callable(A)):
+        return np.asarray(A(X),dtype='float64').reshape(X.shape)
+    AX = A@X
+    if (IsSparse(AX)):
+        AX = AX.toarray()
+    return np.asarray(AX).reshape(X.shape)
+
+def Arnoldi(A, k, X0 = None, tol = 1e-10, max_restarts = 100, 
+            subspace = None, symmetric = False):
+    '''
+    Arnoldi(A, k, X0 = None, tol = 1e-10, max_restarts = 100, 
+            subspace = None, symmetric = False)
+    
+    Arnoldi computes the k eigenvalues of A with largest absolute value, and
+    their eigenvectors, without any decomposition of A itself.  Only 
+    products AX are needed, so A can be a large sparse matrix or a function
+    that returns AX.  An orthonormal basis of the Krylov subspace spanned by
+    X0, AX0, A^2X0, ... is built up to dimension subspace (2k+20 by default)
+    and the eigenvalues of the projection of A onto that subspace are used
+    as approximations.  The approximate eigenvectors for the k eigenvalues
+    are then kept, along with about half of the others as a buffer, and 
+    the subspace is built up again, until each of the k pairs (t,X) 
+    satisfies |AX - tX| < tol|t|.  The buffer keeps eigenvalues close to 
+    the kth in absolute value, but of the other sign, from being lost at a
+    restart.  If max_restarts is reached first, a message is printed and 
+    the current approximations are returned.  When symmetric is True, the 
+    projection is symmetric (tridiagonal) and the results are real.  This
+    is the Lanczos method; see Lanczos.
+    
+    Eigenvalues of a nonsymmetric A may be complex, in which case complex 
+    arrays are returned.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn, SciPy sparse matrix, or function
+    k : int
+    X0: optional NumPy array object of dimension nx1, required if A is a 
+        function
+    tol: optional float
+    max_restarts: optional int
+    subspace: optional int
+    symmetric: optional bool
+
+    Returns
+    -------
+    eigenvalues: NumPy array object of dimension k
+    X: NumPy array object of dimension nxk with unit eigenvectors as columns
+    '''
+    if (X0 is None):
+        if (callable(A)):
+            print("Arnoldi requires X0 when A is a function.")
+            return None
+        X0 = np.random.default_rng(0).standard_normal(A.shape[0])
+    X0 = np.asarray(X0,dtype='float64').reshape((-1,1))
+    n = X0.shape[0]
+    
+    if (subspace is None):
+        subspace = 2*k + 20
+    m = min(subspace,n)
+    
+    V = np.zeros((n,m+1),order='F')
+    H = np.zeros((m+1,m))
+    V[:,0] = X0[:,0]/Magnitude(X0)
+    p = 0  # Number of basis vectors kept from the previous restart
+    
+    for restart in range(max_restarts+1):
+        # Extend the basis to m vectors.  Each new vector is made orthogonal
+        # to all previous ones twice, to guard against loss of orthogonality.
+        for j in range(p,m):
+            W = ApplyOperator(A,V[:,j:j+1])[:,0]
+            for sweep in range(2):
+                coefficients = V[:,:j+1].transpose()@W
+                W -= V[:,:j+1]@coefficients
+                H[:j+1,j] += coefficients
+            H[j+1,j] = Magnitude(W)
+            if (H[j+1,j] == 0):
+                # The subspace is invariant, so its eigenvalues are exact
+                m = j+1
+                break
+            V[:,j+1] = W/H[j+1,j]
+        
+        # Eigenvalues of the projection, with the k largest in absolute value
+        if (symmetric):
+            theta, Y = np.linalg.eigh(H[:m,:m])
+        else:
+            theta, Y = np.linalg.eig(H[:m,:m])
+        order = np.argsort(-np.abs(theta))
+        theta = theta[order]
+        Y = Y[:,order]
+        
+        # Residual |AX - tX| of each of the k wanted pairs
+        residuals = np.abs(H[m,m-1]*Y[m-1,:k])
+        if (np.all(residuals <= tol*np.abs(theta[:k])) or m == n or H[m,m-1] == 0):
+            break
+        if (restart == max_restarts):
+            print("Arnoldi did not converge in",max_restarts,"restarts.")
+            break
+        
+        # Keep the approximate eigenvectors for the k wanted eigenvalues and
+        # about half of the rest, as in implicitly restarted Arnoldi.  For a
+        # complex pair, the real and imaginary parts of one vector span the 
+        # same space as the pair, so a pair is not split.
+        keep = max(k,min(k + (m-k)//2,m-1))
+        if (not symmetric and keep < m and theta[keep-1].imag != 0 
+            and np.isclose(theta[keep],theta[keep-1].conjugate())):
+            if (keep+1 < m):
+                keep += 1
+            else:
+                keep -= 1
+        Z = []
+        for i in range(keep):
+            if (theta[i].imag == 0):
+                Z.append(Y[:,i].real)
+            elif (theta[i].imag > 0):
+                Z.append(Y[:,i].real)
+                Z.append(Y[:,i].imag)
+        Z, R = QRFactorization.__wrapped__(np.array(Z).transpose(),method='householder')
+        p = Z.shape[1]
+        
+        # Restart with AV = VH + (residual) still satisfied by the kept vectors
+        H_kept = Z.transpose()@H[:m,:m]@Z
+        last_row = H[m,m-1]*Z[m-1,:]
+        V[:,:p] = V[:,:m]@Z
+        V[:,p] = V[:,m]
+        H[:,:] = 0
+        H[:p,:p] = H_kept
+        H[p,:p] = last_row
+    
+    X = V[:,:m]@Y[:,:k]
+    if (not symmetric and np.all(theta[:k].imag == 0)):
+        theta = theta.real
+        X = X.real
+    X /= np.linalg.norm(X,axis=0)
+    
+    return theta[:k], X
+
+def BackSubstitution(U, Y, return_status = False, backend = None, 
+                     dtype = None):
+    '''
+    BackSubstitution(U, Y, return_status = False, backend = None, 
+                     dtype = None)
     (BSV)
     
     BackSubstitution performs back substitution to find the solution to a
-    square upper triangular system UX = Y.  There is no error checking to
-    ensure that U is of full rank.
+    square upper triangular system UX = Y.  Y may hold k right hand sides 
+    as the columns of an mxk array, and they are all solved together.  
+    U may be a SciPy sparse matrix, in which case only its nonzero entries
+    are used.
+    
+    Zero entries in pivot positions of U are reported.  By default a 
+    message is printed for each one.  If return_status is True, no messages
+    are printed and a list of the positions is returned along with X.  In
+    either case X is still returned, for sparse U as well as dense, with 
+    the rows at zero pivots left undivided.
+    
+    With the 'numba' backend, the rows are computed by the compiled loops 
+    in SubstitutionKernel.  The type of the entries of X is chosen by the 
+    dtype policy, as described in WorkingDtype.  The 'numba' backend is 
+    only used when they are float64.
 
     Parameters
     ----------
     U : NumPy array object of dimension mxm
-    Y : NumPy array object of dimension mx1
+    Y : NumPy array object of dimension mx1 or mxk
+    return_status: optional bool
+    backend: optional string, 'numpy' or 'numba'
+    dtype: optional string, dtype policy
 
     Returns
     -------
-    X : NumPy array object of dimension mx1
+    X : NumPy array object of dimension mx1 or mxk
+    singular: list of ints, only if return_status is True
     '''
 
     m = U.shape[0]  # m is number of rows and columns in U
-    X = np.zeros((m,1))
-    
-    for i in range(m-1,-1,-1):  # Calculate entries backward from m-1 to 0
-        X[i] = Y[i]
-        for j in range(i+1,m):
-            X[i] -= U[i][j]*X[j]
-        if (U[i][i] != 0):
-            X[i] /= U[i][i]
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    
+    if (IsSparse(U)):
+        U = sparse.csr_matrix(U,dtype='float64')
+        singular = np.flatnonzero(U.diagonal() == 0)[::-1].tolist()
+        if (len(singular) == 0):
+            Y = np.asarray(Y,dtype='float64').reshape((m,-1))
+            X = sparse_linalg.spsolve_triangular(U,Y,lower=False)
         else:
-            print("Zero entry found in U pivot position",i,".")
+            X = np.array(Y,dtype='float64').reshape((m,-1))
+            diagonal = U.diagonal()
+            for i in range(m-1,-1,-1):  # Only the nonzero entries of row i
+                cols = U.indices[U.indptr[i]:U.indptr[i+1]]
+                vals = U.data[U.indptr[i]:U.indptr[i+1]]
+                X[i] -= vals[cols > i]@X[cols[cols > i]]
+                if (diagonal[i] != 0):
+                    X[i] /= diagonal[i]
+    elif (ActiveBackend(backend) == 'numba' and 
+          WorkingDtype(np.result_type(U,Y),dtype) == np.float64):
+        U = np.asarray(U,dtype='float64')
+        X = np.array(Y,dtype='float64').reshape((m,-1))
+        singular = SubstitutionKernel(U,X,False,False).tolist()
+    else:
+        working = WorkingDtype(np.result_type(U,Y),dtype)
+        U = np.asarray(U)
+        if (working == object):
+            U = WorkingCopy(U,working)
+        X = WorkingCopy(np.reshape(Y,(m,-1)),working)
+        singular = []
+        
+        for i in range(m-1,-1,-1):  # Calculate rows backward from m-1 to 0
+            X[i] -= U[i,i+1:]@X[i+1:]
+            if (U[i,i] != 0):
+                X[i] /= U[i,i]
+            else:
+                singular.append(i)
+    
+    if (profile is not None):
+        profile.Record('substitution',mark,row_operations=m,
+                       flops=m*m*X.shape[1],copied=X.nbytes)
+    if (return_status):
+        return X, singular
+    for i in singular:
+        print("Zero entry found in U pivot position",i,".")
     return X
 
-def DeterminantIteration(A):
-    ''' 
-    DeterminantIteration(A)
+def BatchDeterminant(A):
+    '''
+    BatchDeterminant(A)
     
-    DeterminantIteration computes the determinant of an nxn A matrix
-    by using the recursive formula.
+    BatchDeterminant computes the determinants of a stack of nxn arrays,
+    given as an array of dimension batch x n x n.  The elimination is 
+    carried out by BatchElimination on all arrays at once.
 
     Parameters
     ----------
-    A: NumPy array object of dimension nxn
-    
+    A : NumPy array object of dimension batch x n x n
+
     Returns
     -------
-    D: int
+    D: NumPy array object of dimension batch
     '''
     # Check shape of A
-    if (A.shape[0] != A.shape[1]):
-        print("Determinant only defined for square arrays.")
+    if (A.ndim != 3 or A.shape[1] != A.shape[2]):
+        print("BatchDeterminant accepts only stacks of square arrays.")
         return None
-    n = A.shape[0]  # n is number of rows and columns in A
     
-    size = A.shape[0]
-    if size == 2:
-        return A[0,0]*A[1,1]-A[0,1]*A[1,0]
+    W = np.array(A.transpose(1,2,0),dtype='float64',order='C')
+    singular, D = BatchElimination(W,A.shape[1])
     
-    else:
-        m=0  # Determinant expansion along row 0
-        D=0. # Set determinant to zero and add contributions
-
-        for n in range(size):
-            minor = []
-            k=-1
-            # Construct (m,n) minor array (row m, column n deleted)
-            for i in range(size):
-                if(i != m): 
-                    minor.append([])    
-                    k += 1
-                    for j in range(size):
-                        if(j != n):
-                            minor[k].append(A[i,j])
-            Minor_array = np.array(minor)
-            cofactor = (-1)**(m+n)*DeterminantIteration(Minor_array)
-            D += cofactor*A[m,n]
-        return D
+    return D
 
-def DotProduct(U,V):
-    ''' 
-    DotProduct(U,V)
+def BatchElimination(W, n):
+    '''
+    BatchElimination(W, n)
+    
+    BatchElimination carries out elimination with partial pivoting on a 
+    whole stack of arrays at the same time, followed by back substitution,
+    so that the first n columns of each array are reduced to the identity.
+    The stack is stored with the batch index last: W[i,j,:] holds entry 
+    (i,j) of every array.  Each row operation is then a single NumPy 
+    operation on contiguous memory across the whole stack, which is much 
+    faster than a loop over many small systems.  W is modified in place.
     
-    DotProduct computes the Euclidean product of U and V
+    Arrays with no nonzero pivot in some column are marked as singular, 
+    and the rest of their elimination is not meaningful.
     
     Parameters
     ----------
-    U : NumPy array object of dimension nx1
-    V : NumPy array object of dimension nx1
+    W : NumPy array object of dimension n x (n+k) x batch with dtype float64
+    n : int
     
     Returns
     -------
-    product: float
+    singular: NumPy array object of bools of dimension batch
+    D: NumPy array object of dimension batch, the determinants of the 
+       first n columns
+    '''
+    columns = W.shape[1]
+    batch = W.shape[2]
+    
+    singular = np.zeros(batch,dtype=bool)
+    D = np.ones(batch)
+    product = np.empty((columns,batch))
+    
+    for k in range(n):
+        # Swap the entry of largest absolute value into the pivot position,
+        # only for the arrays where it is not already there
+        pivot_rows = k + np.argmax(np.abs(W[k:,k,:]),axis=0)
+        swapped = np.flatnonzero(pivot_rows != k)
+        if (swapped.size > 0):
+            rows = W[pivot_rows[swapped],:,swapped]
+            W[pivot_rows[swapped],:,swapped] = W[k][:,swapped].transpose()
+            W[k][:,swapped] = rows.transpose()
+            D[swapped] = -D[swapped]
+        
+        pivots = W[k,k].copy()
+        D *= pivots
+        zero = (pivots == 0)
+        singular |= zero
+        pivots[zero] = 1.
+        
+        # Set pivot entries to one and create zeros below
+        W[k,k:] /= pivots
+        for i in range(k+1,n):
+            np.multiply(W[i,k],W[k,k:],out=product[k:])
+            W[i,k:] -= product[k:]
+    
+    # Back substitution on the remaining columns, with pivots equal to one
+    for k in range(n-1,-1,-1):
+        for i in range(k):
+            np.multiply(W[i,k],W[k,n:],out=product[n:])
+            W[i,n:] -= product[n:]
+        W[:k,k] = 0
+    
+    return singular, D
+
+def BatchInverse(A):
     '''
+    BatchInverse(A)
+    
+    BatchInverse computes the inverses of a stack of nxn arrays, given as 
+    an array of dimension batch x n x n, by reducing each array augmented
+    with the identity using BatchElimination.  Entries of the result are 
+    set to nan for arrays that are singular.
 
-    # Check shapes of U and V
-    if (U.shape[1] != 1 or V.shape[1] != 1):
-        print("Dot product only accepts column vectors.")
-        return
-    # Check shape of V
-    if (U.shape[0] != V.shape[0]):
-        print("Dot product only accepts column vectors of equal length.")
-        return
+    Parameters
+    ----------
+    A : NumPy array object of dimension batch x n x n
 
-    n = U.shape[0]
-    product = 0.0
+    Returns
+    -------
+    Inverse: NumPy array object of dimension batch x n x n
+    singular: NumPy array object of bools of dimension batch
+    '''
+    # Check shape of A
+    if (A.ndim != 3 or A.shape[1] != A.shape[2]):
+        print("BatchInverse accepts only stacks of square arrays.")
+        return None
+    batch = A.shape[0]
+    n = A.shape[1]
     
-    for i in range(n):
-        product += U[i,0]*V[i,0]
-
-    return product
+    W = np.zeros((n,2*n,batch))
+    W[:,:n,:] = A.transpose(1,2,0)
+    W[:,n:,:] = np.eye(n).reshape((n,n,1))
+    singular, D = BatchElimination(W,n)
+    
+    Inverse = W[:,n:,:].transpose(2,0,1).copy()
+    Inverse[singular] = np.nan
+    
+    return Inverse, singular
 
-def DrawGraph(A, pos = None):
+def BatchSolveSystem(A, B):
     '''
-    DrawGraph(A, pos = None)
+    BatchSolveSystem(A, B)
     
-    Draws a directed graph based on adjacency matrix A.
+    BatchSolveSystem solves AX=B for a stack of systems at once.  A holds 
+    the nxn arrays and B the right hand sides, either one vector for each
+    system (batch x n) or k vectors for each system (batch x n x k).  The 
+    systems are solved together by BatchElimination.  Entries of X are set
+    to nan for systems where A is singular.
 
     Parameters
     ----------
-    A : NumPy array object.
-    pos: Optional dictionary to specify node coordinates
-    
+    A : NumPy array object of dimension batch x n x n
+    B : NumPy array object of dimension batch x n or batch x n x k
+
     Returns
     -------
-    pos: Dictionary of node coordinates used to draw graph
-
+    X: NumPy array object of the same dimension as B
+    singular: NumPy array object of bools of dimension batch
     '''
-    plt.figure(figsize=(6,6))
-    G = nx.DiGraph()
+    # Check shape of A
+    if (A.ndim != 3 or A.shape[1] != A.shape[2]):
+        print("BatchSolveSystem accepts only stacks of square arrays.")
+        return None
+    batch = A.shape[0]
+    n = A.shape[1]
     
-    N = A.shape[0]
-    edge_list = []
+    B_shape = B.shape
+    B = np.reshape(B,(batch,n,-1))
     
-    for i in range(N):
-        for j in range(N):
-            if(A[i,j] == 1):
-                edge_list.append((i,j))
+    W = np.zeros((n,n+B.shape[2],batch))
+    W[:,:n,:] = A.transpose(1,2,0)
+    W[:,n:,:] = B.transpose(1,2,0)
+    singular, D = BatchElimination(W,n)
     
-    G.add_edges_from(edge_list)
-    if (pos == None):
-        pos = nx.spring_layout(G)
+    X = W[:,n:,:].transpose(2,0,1).copy()
+    X[singular] = np.nan
     
-    options = {"node_size" : 500, "with_labels": True,"font_size":20}
-    nx.draw(G, pos,connectionstyle='arc3, rad = 0.1',arrowsize=30,**options)
-    return pos
+    return X.reshape(B_shape), singular
 
-def FullRowReduction(A, tol = 1e-14):
-    ''' 
-    FullRowReduction(A, tol = 1e-14)
-    
-    Produces RREF for matrix of any shape.  No pivot strategy implemented.
-    Entries with abs value < tol are set to zero to account for roundoff
-    errors.
+def BlockedElimination(B, pivoting = False, L = None, perm = None, 
+                       block_size = 128, workers = None, backend = None):
+    '''
+    BlockedElimination(B, pivoting = False, L = None, perm = None, 
+                       block_size = 128, workers = None, backend = None)
+    
+    BlockedElimination produces the same row echelon form as Elimination 
+    with rref = False, but takes the columns of B in panels of block_size 
+    columns.  Each panel is reduced by Elimination, and the same steps are 
+    then applied to the columns to the right of the panel all at once.  
+    Those columns are split into tiles that are updated independently with
+    matrix products on a pool of threads, since NumPy releases the GIL while
+    it works on large arrays.  The results agree with Elimination up to 
+    roundoff.  The array B is modified in place, and L and perm are used as
+    in Elimination.
+    
+    Only one panel and one tile at a time are held in memory, so B can be 
+    an np.memmap array stored on disk that is too large to load.  For such
+    arrays the tiles are limited to block_size columns.
+    
+    Scaling with the number of workers is best when the BLAS library used 
+    by NumPy runs on a single thread, for example with OMP_NUM_THREADS=1.
     
     Parameters
     ----------
-    A : NumPy array object of dimension mxn
-    tol: optional float
+    B : NumPy array object of dimension mxn with dtype float64
+    pivoting: optional bool
+    L: optional NumPy array object of dimension mxm
+    perm: optional NumPy array object of dimension m
+    block_size: optional int
+    workers: optional int, number of threads
+    backend: optional string, 'numpy' or 'numba', used for the panels
 
     Returns
     -------
-    B: NumPy array object of dimension mxn
+    pivots: list of (row,col) tuples giving the pivot positions
     '''
     
-    m = A.shape[0]  # m is number of rows in A
-    n = A.shape[1]  # n is number of columns in A
-
-    B = np.copy(A).astype('float64')
-
-    # Set initial pivot search position
-    pivot_row = 0
-    pivot_col = 0
+    m = B.shape[0]  # m is number of rows in B
+    n = B.shape[1]  # n is number of columns in B
     
-    # Continue steps of elimination while possible pivot positions are 
-    # within bounds of the array.
+    one = B.dtype.type(1)  # 1 with the type of the entries of B
+    pivots = []
+    profile = active_profile
     
-    while(pivot_row < m and pivot_col < n):
-
-        # Set pivot value to current pivot position
-        pivot = B[pivot_row,pivot_col]
+    for k in range(0,min(m,n),block_size):
+        p = min(block_size,min(m,n)-k)
+        
+        # Reduce the panel, recording its multipliers and row swaps.  The 
+        # entries of B to the left of the panel and below row k are already 
+        # zero, so the swaps only need to be carried to the right of it.
+        L_panel = np.zeros((m-k,p),dtype=B.dtype)
+        panel_perm = np.arange(m-k)
+        panel = np.array(B[k:,k:k+p])
+        Elimination(panel,pivoting=pivoting,L=L_panel,perm=panel_perm,
+                    backend=backend)
+        B[k:,k:k+p] = panel
+        for j in range(p):
+            if (L_panel[j,j] != 0):
+                pivots.append((k+j,k+j))
+            elif (L is None):
+                print("Pivot could not be found in column",k+j,".")
+        if (L is not None):
+            L[k:,:k] = L[k:,:k][panel_perm]
+            L[k:,k:k+p] = L_panel
+        if (perm is not None):
+            perm[k:] = perm[k:][panel_perm]
         
-        # If pivot is zero, search down current column, and then subsequent
-        # columns (at or beyond pivot_row) for the next nonzero entry in the 
-        # array is found, or the last entry is reached.
+        def UpdateTile(start, stop):
+            if (profile is not None):
+                mark = time.perf_counter()
+            tile = B[k:,start:stop]
+            tile[:] = tile[panel_perm]
+            # Steps of elimination on the rows of the panel, then the rows 
+            # below it all at once
+            for j in range(p):
+                if (L_panel[j,j] != 0):
+                    tile[j] *= one/L_panel[j,j]
+                    tile[j+1:p] -= np.outer(L_panel[j+1:p,j],tile[j])
+            tile[p:] -= L_panel[p:]@tile[:p]
+            if (profile is not None):
+                profile.Record('tile update',mark,row_operations=(m-k)*p,
+                               flops=2*(m-k)*p*tile.shape[1],copied=tile.nbytes)
+        
+        if (isinstance(B,np.memmap)):
+            tiles = ColumnTiles(k+p,n,workers,block_size)
+        else:
+            tiles = ColumnTiles(k+p,n,workers)
+        RunTiles(UpdateTile,tiles,workers)
+    
+    return pivots
 
-        row_search = pivot_row
-        col_search = pivot_col
-        search_end = False
+def ChooseSolver(A):
+    '''
+    ChooseSolver(A)
+    
+    ChooseSolver picks a method for SolveSystem based on the size, sparsity 
+    and symmetry of A.  Elimination is used for dense arrays up to 4000 rows
+    and sparse matrices up to 200000 rows.  Larger systems use conjugate
+    gradients if A is symmetric with a positive diagonal, and GMRES 
+    otherwise.  GMRES is always chosen when A is a function.
 
-        while(pivot == 0 and not search_end):
-            if(row_search < m-1):
-                row_search += 1
-                pivot = B[row_search,col_search]
-            else:
-                if(col_search < n-1):
-                    row_search = pivot_row
-                    col_search += 1
-                    pivot = B[row_search,col_search]
-                else:  
-                    # col_search = n-1 and row_search = m-1
-                    search_end = True
-                        
-        # Swap row if needed to bring pivot to position for rref
-        if (pivot != 0 and pivot_row != row_search):
-            B = RowSwap(B,pivot_row,row_search)
-            pivot_row, row_search = row_search, pivot_row
-            
-        # Set pivot position to search position
-        pivot_row = row_search
-        pivot_col = col_search
-            
-        # If pivot is nonzero, carry on with elimination in pivot column 
-        if (pivot != 0):
-            
-            # Set pivot entry to one
-            B = RowScale(B,pivot_row,1./B[pivot_row,pivot_col])
+    Parameters
+    ----------
+    A : NumPy array object, SciPy sparse matrix, or function
 
-            # Create zeros above pivot
-            for i in range(pivot_row):    
-                B = RowAdd(B,pivot_row,i,-B[i][pivot_col])
-                # Force known zeros
-                B[i,pivot_col] = 0
+    Returns
+    -------
+    method: string, one of 'direct', 'cg' or 'gmres'
+    '''
+    if (callable(A)):
+        return 'gmres'
+    
+    n = A.shape[0]
+    if (IsSparse(A)):
+        if (n <= 200000):
+            return 'direct'
+        symmetric = (abs(A - A.transpose()).max() == 0)
+    else:
+        if (n <= 4000):
+            return 'direct'
+        symmetric = np.array_equal(A,A.transpose())
+    
+    if (symmetric and np.all(A.diagonal() > 0)):
+        return 'cg'
+    return 'gmres'
 
-            # Create zeros below pivot
-            for i in range(pivot_row+1,m):    
-                B = RowAdd(B,pivot_row,i,-B[i][pivot_col])
-                # Force known zeros
-                B[i,pivot_col] = 0
+def ClearLayouts():
+    '''
+    ClearLayouts()
+    
+    ClearLayouts removes the node coordinates kept by GraphLayout, so that 
+    the memory they use is freed.
 
-            # Force small numbers to zero to account for roundoff error
-            for i in range(m):
-                for j in range(n):
-                    if abs(B[i,j])< tol :
-                        B[i,j] = 0
+    Returns
+    -------
+    None
+    '''
+    layouts.clear()
 
-        # Advance to next possible pivot position
-        pivot_row += 1
-        pivot_col += 1
-        
-    return B
+def ColumnTiles(start, stop, workers = None, size = None):
+    '''
+    ColumnTiles(start, stop, workers = None, size = None)
+    
+    ColumnTiles splits the columns from start to stop into tiles for 
+    RunTiles.  There are four tiles for each worker so that the work stays
+    balanced, and a single tile when only one worker is used.  If size is
+    given, more tiles are used where needed so that no tile has more than 
+    size columns.
+
+    Parameters
+    ----------
+    start: int
+    stop: int
+    workers: optional int, number of threads
+    size: optional int
 
-def HighlightSubgraph(A,pos,subgraph):
+    Returns
+    -------
+    tiles: list of (start,stop) tuples
+    '''
+    count = ActiveWorkers(workers)
+    if (count > 1):
+        count = min(4*count,stop-start)
+    if (size is not None):
+        count = max(count,-(-(stop-start)//size))
+    bounds = np.linspace(start,stop,count+1).astype(int)
+    return [(bounds[i],bounds[i+1]) for i in range(count) if bounds[i] < bounds[i+1]]
+
+def ConjugateGradient(A, B, X0 = None, tol = 1e-10, max_iter = None):
     '''
-    HighlightSubgraph(A,pos,subgraph)
+    ConjugateGradient(A, B, X0 = None, tol = 1e-10, max_iter = None)
+    BSV:  Accepts both (n,1) and (n,) for B.  Returns shape (n,1)
     
-    Draws directed graph based on adjacency matrix A, with node positions pos,
-    then colors a subgraph containing nodes in nodelist and edges connecting
-    connecting nodes in nodelist    
+    ConjugateGradient solves AX=B by the method of conjugate gradients, 
+    which requires A to be symmetric and positive definite.  Iteration 
+    starts from X0, or from zero if X0 is not given, and stops when the 
+    relative residual |B-AX|/|B| is less than tol, or after max_iter steps 
+    (n steps by default).  A may be a function that returns AX.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn, SciPy sparse matrix, or function
+    B : NumPy array object of dimension nx1
+    X0: optional NumPy array object of dimension nx1
+    tol: optional float
+    max_iter: optional int
 
+    Returns
+    -------
+    X: NumPy array object of dimension nx1
+    residuals: list of relative residuals, one for each step
+    '''
+    B = np.asarray(B,dtype='float64').reshape((-1,1))
+    n = B.shape[0]
+    if (max_iter is None):
+        max_iter = n
+    
+    if (X0 is None):
+        X = np.zeros((n,1))
+    else:
+        X = np.array(X0,dtype='float64').reshape((n,1))
+    
+    B_magnitude = Magnitude(B)
+    if (B_magnitude == 0):
+        B_magnitude = 1.
+    
+    Res = B - ApplyOperator(A,X)
+    P = Res.copy()
+    res_squared = DotProduct(Res,Res)
+    residuals = [math.sqrt(res_squared)/B_magnitude]
+    
+    for k in range(max_iter):
+        if (residuals[-1] < tol):
+            break
+        AP = ApplyOperator(A,P)
+        alpha = res_squared/DotProduct(P,AP)
+        X += alpha*P
+        Res -= alpha*AP
+        new_res_squared = DotProduct(Res,Res)
+        P = Res + (new_res_squared/res_squared)*P
+        res_squared = new_res_squared
+        residuals.append(math.sqrt(res_squared)/B_magnitude)
+    
+    return X, residuals
+
+def CopyRows(A, out, block_size = 4096):
+    '''
+    CopyRows(A, out, block_size = 4096)
+    
+    CopyRows copies A into out, block_size rows at a time, converting the 
+    entries to the dtype of out.  Only one block is held in memory, so A 
+    and out can be np.memmap arrays that are too large to load.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension mxn
+    out : NumPy array object of dimension mxn
+    block_size: optional int
+
+    Returns
+    -------
+    out: NumPy array object of dimension mxn
+    '''
+    for start in range(0,A.shape[0],block_size):
+        out[start:start+block_size] = A[start:start+block_size]
+    return out
+
+@Cached
+def DeterminantIteration(A, method = None):
+    ''' 
+    DeterminantIteration(A, method = None)
+    
+    DeterminantIteration computes the determinant of an nxn A matrix.  The
+    method used is chosen with method.
+    
+    'elimination': A is factored with LUFactorization and the determinant 
+        is the product of the pivots, with sign given by the row swaps.
+        This is the default for arrays of floats.
+    'exact': Fraction-free (Bareiss) elimination with Python integers, or 
+        with Fractions if A contains them, so that no roundoff occurs.  
+        This is the default for arrays of integers, booleans and objects.
+        Booleans are taken as the integers 0 and 1.
+    'cofactor': Cofactor expansion along row 0 using the recursive formula.
+        The number of operations grows as n!, so it is only available as a
+        reference for n <= 10.
+
+    Parameters
+    ----------
+    A: NumPy array object of dimension nxn
+    method: optional string, 'elimination', 'exact' or 'cofactor'
+    
+    Returns
+    -------
+    D: int, Fraction or float
+    '''
+    # Check shape of A
+    if (A.shape[0] != A.shape[1]):
+        print("Determinant only defined for square arrays.")
+        return None
+    n = A.shape[0]  # n is number of rows and columns in A
+    if (A.dtype.kind == 'b'):
+        A = A.astype(int)
+    
+    if (method is None):
+        if (A.dtype.kind in 'iuO'):
+            method = 'exact'
+        else:
+            method = 'elimination'
+    
+    if (method == 'elimination'):
+        return LUFactorization(A,dtype='float64').Determinant()
+    
+    if (method == 'exact'):
+        # Entries are converted to Python ints, or Fractions if needed
+        M = np.empty((n,n),dtype=object)
+        exact_division = True
+        for i in range(n):
+            for j in range(n):
+                entry = A[i,j]
+                if (isinstance(entry,(int,np.integer))):
+                    M[i,j] = int(entry)
+                else:
+                    M[i,j] = Fraction(entry)
+                    exact_division = False
+        
+        sign = 1
+        previous_pivot = 1
+        for k in range(n-1):
+            # Find a nonzero pivot in column k
+            if (M[k,k] == 0):
+                nonzero = [i for i in range(k+1,n) if M[i,k] != 0]
+                if (len(nonzero) == 0):
+                    return 0
+                M[[k,nonzero[0]]] = M[[nonzero[0],k]]
+                sign = -sign
+            
+            # Each step of Bareiss elimination divides exactly by the 
+            # previous pivot, so all entries remain integers.
+            M[k+1:,k+1:] = M[k+1:,k+1:]*M[k,k] - np.outer(M[k+1:,k],M[k,k+1:])
+            if (exact_division):
+                M[k+1:,k+1:] //= previous_pivot
+            else:
+                M[k+1:,k+1:] /= previous_pivot
+            previous_pivot = M[k,k]
+        
+        return sign*M[n-1,n-1]
+    
+    if (method != 'cofactor'):
+        print("Method",method,"is not recognized.")
+        return None
+    
+    if (n > 10):
+        print("Cofactor expansion is only available for n <= 10.")
+        return None
+    
+    size = A.shape[0]
+    if size == 1:
+        return A[0,0]
+    
+    if size == 2:
+        return A[0,0]*A[1,1]-A[0,1]*A[1,0]
+    
+    else:
+        m=0  # Determinant expansion along row 0
+        D=0. # Set determinant to zero and add contributions
+
+        for n in range(size):
+            minor = []
+            k=-1
+            # Construct (m,n) minor array (row m, column n deleted)
+            for i in range(size):
+                if(i != m): 
+                    minor.append([])    
+                    k += 1
+                    for j in range(size):
+                        if(j != n):
+                            minor[k].append(A[i,j])
+            Minor_array = np.array(minor)
+            cofactor = (-1)**(m+n)*DeterminantIteration.__wrapped__(Minor_array,'cofactor')
+            D += cofactor*A[m,n]
+        return D
+
+def DotProduct(U,V):
+    ''' 
+    DotProduct(U,V)
+    BSV:  Accepts both (n,1) and (n,) for U and V.  Returns a float.
+    
+    DotProduct computes the Euclidean product of U and V.  If U and V are
+    nxk arrays, the k products of matching columns are computed together 
+    and returned as an array of dimension k.  If one of U and V is a single 
+    vector, its product with each column of the other is computed.
+    
+    Parameters
+    ----------
+    U : NumPy array object of dimension nx1 or nxk
+    V : NumPy array object of dimension nx1 or nxk
+    
+    Returns
+    -------
+    product: float, or NumPy array object of dimension k
+    '''
+
+    # Vectors of shape (n,) are treated as (n,1)
+    if (U.ndim == 1):
+        U = U.reshape((U.shape[0],1))
+    if (V.ndim == 1):
+        V = V.reshape((V.shape[0],1))
+    
+    # Check shapes of U and V
+    if (U.shape[0] != V.shape[0]):
+        print("Dot product only accepts column vectors of equal length.")
+        return
+    if (U.shape[1] != V.shape[1] and U.shape[1] != 1 and V.shape[1] != 1):
+        print("Dot product requires the same number of columns in U and V.")
+        return
+    
+    if (IsSparse(U) or IsSparse(V)):
+        if (U.shape[1] != V.shape[1]):
+            products = U.transpose()@V
+            if (IsSparse(products)):
+                products = products.toarray()
+            products = np.asarray(products).ravel()
+        else:
+            products = np.asarray(sparse.csr_matrix(U).multiply(V).sum(axis=0)).ravel()
+        if (products.shape[0] == 1):
+            return products[0]
+        return products
+    
+    if (U.shape[1] == 1 and V.shape[1] == 1):
+        return U[:,0]@V[:,0]
+    
+    # Products of a single vector with a batch of columns is a 
+    # matrix-vector product.  Otherwise take products of matching columns.
+    if (U.shape[1] == 1):
+        return V.transpose()@U[:,0]
+    if (V.shape[1] == 1):
+        return U.transpose()@V[:,0]
+    return np.einsum('ij,ij->j',U,V)
+
+def DrawGraph(A, pos = None, fast = None, filename = None):
+    '''
+    DrawGraph(A, pos = None, fast = None, filename = None)
+    
+    Draws a directed graph based on adjacency matrix A.  A may be a SciPy
+    sparse matrix.  If pos is not given, the node coordinates are found by
+    GraphLayout, which reuses them when the same graph is drawn again.
+    
+    If fast is True, the graph is drawn by RenderGraph as a single image 
+    with no labels or arrows, which is practical for graphs with many 
+    thousands of nodes.  By default this is done for graphs with 1000 or 
+    more nodes.  If filename is given, the image is written to that file 
+    instead of being shown in a figure.
+
+    Parameters
+    ----------
+    A : NumPy array object.
+    pos: Optional dictionary to specify node coordinates
+    fast: optional bool
+    filename: optional string
+    
+    Returns
+    -------
+    pos: Dictionary of node coordinates used to draw graph
+
+    '''
+    edge_list = EdgeList(A)
+    if (pos == None):
+        pos = GraphLayout(A,edge_list)
+    if (fast is None):
+        fast = (A.shape[0] >= 1000)
+    
+    if (fast):
+        image = RenderGraph(pos,edge_list)
+        if (filename is None):
+            plt.figure(figsize=(6,6))
+            plt.imshow(image)
+            plt.axis('off')
+        else:
+            plt.imsave(filename,image)
+        return pos
+    
+    plt.figure(figsize=(6,6))
+    G = nx.DiGraph()
+    G.add_edges_from(edge_list)
+    
+    options = {"node_size" : 500, "with_labels": True,"font_size":20}
+    nx.draw(G, pos,connectionstyle='arc3, rad = 0.1',arrowsize=30,**options)
+    return pos
+
+def EdgeList(A):
+    '''
+    EdgeList(A)
+    
+    EdgeList returns the edges (i,j) of the directed graph with adjacency 
+    matrix A, that is the positions where A[i,j] = 1.  If A is a SciPy
+    sparse matrix, only its stored entries are examined.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension NxN
+
+    Returns
+    -------
+    edge_list: list of (int,int) tuples
+    '''
+    if (IsSparse(A)):
+        A = A.tocoo()
+        edges = (A.data == 1)
+        return sorted(zip(A.row[edges].tolist(),A.col[edges].tolist()))
+    
+    rows, cols = np.nonzero(np.asarray(A) == 1)
+    return list(zip(rows.tolist(),cols.tolist()))
+
+def Elimination(B, rref = False, pivoting = False, tol = 1e-14, L = None,
+                perm = None, backend = None):
+    ''' 
+    Elimination(B, rref = False, pivoting = False, tol = 1e-14, L = None,
+                perm = None, backend = None)
+    
+    Elimination carries out the steps of elimination used by RowReduction
+    (rref = False) and FullRowReduction (rref = True).  The array B is 
+    modified in place.  Each row operation acts on whole rows with NumPy 
+    slices, so no copies of B are made along the way.
+    
+    If pivoting is False, the first nonzero entry found is used as the pivot,
+    which gives the same results as RowSwap, RowScale and RowAdd applied
+    step by step.  If pivoting is True, the entry of largest absolute value 
+    in the pivot column is used instead (partial pivoting).  In rref mode,
+    entries with abs value < tol are set to zero after each pivot.
+    
+    When producing row echelon form, the steps can be recorded for use in an
+    LU factorization.  If L is an mxm array, the pivots and multipliers are
+    stored in its columns, and if perm is an array of length m, it is 
+    permuted along with the rows of B.  When elimination is complete and
+    L and perm started as zeros and arange(m), A[perm] = L@triu(B) where A 
+    is the original B.  When L is given, a column with no pivot leaves a 
+    zero on the diagonal of L instead of printing a message.
+    
+    With the 'numba' backend, the steps are carried out by the compiled 
+    loops in EliminationKernel, with identical results.  B can also hold
+    float32 entries or Fractions (dtype object), in which case the NumPy 
+    steps are always used and the entries keep their type.
+    
+    Parameters
+    ----------
+    B : NumPy array object of dimension mxn with dtype float64, float32 
+        or object
+    rref: optional bool
+    pivoting: optional bool
+    tol: optional float
+    L: optional NumPy array object of dimension mxm
+    perm: optional NumPy array object of dimension m
+    backend: optional string, 'numpy' or 'numba'
+
+    Returns
+    -------
+    pivots: list of (row,col) tuples giving the pivot positions
+    '''
+
+    m = B.shape[0]  # m is number of rows in B
+    n = B.shape[1]  # n is number of columns in B
+    one = B.dtype.type(1)  # 1 and 0 with the type of the entries of B
+    zero = B.dtype.type(0)
+    if (B.dtype == object):
+        one = Fraction(1)
+        zero = Fraction(0)
+    
+    # Steps are counted when a Profile is active
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    
+    if (ActiveBackend(backend) == 'numba' and B.dtype == np.float64):
+        rows, cols, missing = EliminationKernel(
+            B,rref,pivoting,tol,
+            np.zeros((0,0)) if L is None else L,
+            np.zeros(0,dtype=np.int64) if perm is None else perm,
+            L is not None,perm is not None)
+        if (profile is not None):
+            eliminated = (m-1)*len(rows) if rref else np.sum(m-1-rows)
+            profile.Record('numba kernel',mark,row_operations=len(rows)+eliminated,
+                           flops=n*(len(rows)+2*eliminated))
+        if (L is None):
+            for k in missing:
+                print("Pivot could not be found in column",k,".")
+        return list(zip(rows.tolist(),cols.tolist()))
+    
+    pivots = []
+    
+    if (not rref):
+        # Row echelon form.  The pivot for step k is taken from column k.
+        for k in range(min(m,n)):
+            column = B[k:,k]
+            if (pivoting):
+                pivot_row = k + np.argmax(np.abs(column))
+            else:
+                nonzero = np.flatnonzero(column)
+                pivot_row = k + nonzero[0] if nonzero.size else m-1
+            pivot = B[pivot_row,k]
+            if (profile is not None):
+                mark = profile.Record('pivot search',mark,flops=m-k)
+            
+            # Swap row if needed
+            if (pivot_row != k):
+                B[[k,pivot_row]] = B[[pivot_row,k]]
+                if (L is not None):
+                    L[[k,pivot_row],:k] = L[[pivot_row,k],:k]
+                if (perm is not None):
+                    perm[[k,pivot_row]] = perm[[pivot_row,k]]
+                if (profile is not None):
+                    mark = profile.Record('row swap',mark,row_operations=1,
+                                          copied=2*B[k].nbytes)
+            
+            # If pivot is nonzero, carry on with elimination in column k
+            if (pivot != 0):
+                B[k] *= one/B[k,k]
+                if (profile is not None):
+                    mark = profile.Record('row scale',mark,row_operations=1,flops=n)
+                if (L is not None):
+                    L[k,k] = pivot
+                    L[k+1:,k] = B[k+1:,k]
+                B[k+1:] -= np.outer(B[k+1:,k],B[k])
+                if (profile is not None):
+                    mark = profile.Record('elimination',mark,row_operations=m-k-1,
+                                          flops=2*(m-k-1)*n,copied=B[k+1:].nbytes)
+                pivots.append((k,k))
+            elif (L is None):
+                print("Pivot could not be found in column",k,".")
+        return pivots
+
+    # Reduced row echelon form.  Set initial pivot search position
+    pivot_row = 0
+    pivot_col = 0
+    
+    while(pivot_row < m and pivot_col < n):
+        
+        # Search the columns at or beyond pivot_col for the first one that 
+        # has a nonzero entry at or below pivot_row.
+        if (not B[pivot_row:,pivot_col].any()):
+            nonzero_cols = np.flatnonzero(B[pivot_row:,pivot_col:].any(axis=0))
+            if (nonzero_cols.size == 0):
+                break
+            pivot_col += nonzero_cols[0]
+        
+        column = B[pivot_row:,pivot_col]
+        if (pivoting):
+            row_search = pivot_row + np.argmax(np.abs(column))
+        else:
+            row_search = pivot_row + np.flatnonzero(column)[0]
+        if (profile is not None):
+            mark = profile.Record('pivot search',mark,flops=m-pivot_row)
+        
+        # Swap row if needed to bring pivot to position for rref
+        if (row_search != pivot_row):
+            B[[pivot_row,row_search]] = B[[row_search,pivot_row]]
+            if (profile is not None):
+                mark = profile.Record('row swap',mark,row_operations=1,
+                                      copied=2*B[pivot_row].nbytes)
+
+        # Set pivot entry to one
+        B[pivot_row] *= one/B[pivot_row,pivot_col]
+        if (profile is not None):
+            mark = profile.Record('row scale',mark,row_operations=1,flops=n)
+        
+        # Create zeros above and below pivot
+        multipliers = B[:,pivot_col].copy()
+        multipliers[pivot_row] = 0
+        B -= np.outer(multipliers,B[pivot_row])
+        
+        # Force known zeros
+        B[:pivot_row,pivot_col] = zero
+        B[pivot_row+1:,pivot_col] = zero
+        if (profile is not None):
+            mark = profile.Record('elimination',mark,row_operations=m-1,
+                                  flops=2*(m-1)*n,copied=B.nbytes)
+        
+        # Force small numbers to zero to account for roundoff error
+        B[np.abs(B) < tol] = zero
+        if (profile is not None):
+            mark = profile.Record('tolerance sweep',mark,flops=B.size,
+                                  copied=B.nbytes)
+        
+        pivots.append((pivot_row,pivot_col))
+        
+        # Advance to next possible pivot position
+        pivot_row += 1
+        pivot_col += 1
+        
+    return pivots
+
+@Compiled
+def EliminationKernel(B, rref, pivoting, tol, L, perm, record_L, record_perm):
+    '''
+    EliminationKernel(B, rref, pivoting, tol, L, perm, record_L, record_perm)
+    
+    Loop version of Elimination for the 'numba' backend.  The steps are the
+    same as in Elimination, so the results are identical.  L and perm are 
+    only used if record_L and record_perm are True.
+
+    Returns
+    -------
+    pivot_rows: NumPy array object of ints
+    pivot_cols: NumPy array object of ints
+    missing: NumPy array object of ints, columns where no pivot was found
+    '''
+    m = B.shape[0]
+    n = B.shape[1]
+    
+    pivot_rows = np.zeros(min(m,n),dtype=np.int64)
+    pivot_cols = np.zeros(min(m,n),dtype=np.int64)
+    missing = np.zeros(min(m,n),dtype=np.int64)
+    count = 0
+    missing_count = 0
+    
+    if (not rref):
+        for k in range(min(m,n)):
+            pivot_row = -1
+            if (pivoting):
+                largest = -1.
+                for i in range(k,m):
+                    if (abs(B[i,k]) > largest):
+                        largest = abs(B[i,k])
+                        pivot_row = i
+            else:
+                for i in range(k,m):
+                    if (B[i,k] != 0):
+                        pivot_row = i
+                        break
+                if (pivot_row == -1):
+                    pivot_row = m-1
+            pivot = B[pivot_row,k]
+            
+            if (pivot_row != k):
+                for j in range(n):
+                    B[k,j], B[pivot_row,j] = B[pivot_row,j], B[k,j]
+                if (record_L):
+                    for j in range(k):
+                        L[k,j], L[pivot_row,j] = L[pivot_row,j], L[k,j]
+                if (record_perm):
+                    perm[k], perm[pivot_row] = perm[pivot_row], perm[k]
+            
+            if (pivot != 0):
+                scale = 1./B[k,k]
+                for j in range(n):
+                    B[k,j] *= scale
+                if (record_L):
+                    L[k,k] = pivot
+                    for i in range(k+1,m):
+                        L[i,k] = B[i,k]
+                for i in range(k+1,m):
+                    multiplier = B[i,k]
+                    if (multiplier != 0):
+                        for j in range(n):
+                            B[i,j] -= multiplier*B[k,j]
+                pivot_rows[count] = k
+                pivot_cols[count] = k
+                count += 1
+            else:
+                missing[missing_count] = k
+                missing_count += 1
+        return pivot_rows[:count], pivot_cols[:count], missing[:missing_count]
+    
+    pivot_row = 0
+    pivot_col = 0
+    while (pivot_row < m and pivot_col < n):
+        # Find the first column with a nonzero entry at or below pivot_row
+        row_search = -1
+        while (pivot_col < n and row_search == -1):
+            for i in range(pivot_row,m):
+                if (B[i,pivot_col] != 0):
+                    row_search = i
+                    break
+            if (row_search == -1):
+                pivot_col += 1
+        if (row_search == -1):
+            break
+        
+        if (pivoting):
+            largest = -1.
+            for i in range(pivot_row,m):
+                if (abs(B[i,pivot_col]) > largest):
+                    largest = abs(B[i,pivot_col])
+                    row_search = i
+        
+        if (row_search != pivot_row):
+            for j in range(n):
+                B[pivot_row,j], B[row_search,j] = B[row_search,j], B[pivot_row,j]
+        
+        scale = 1./B[pivot_row,pivot_col]
+        for j in range(n):
+            B[pivot_row,j] *= scale
+        
+        for i in range(m):
+            if (i != pivot_row):
+                multiplier = B[i,pivot_col]
+                if (multiplier != 0):
+                    for j in range(n):
+                        B[i,j] -= multiplier*B[pivot_row,j]
+                B[i,pivot_col] = 0
+        
+        for i in range(m):
+            for j in range(n):
+                if (abs(B[i,j]) < tol):
+                    B[i,j] = 0
+        
+        pivot_rows[count] = pivot_row
+        pivot_cols[count] = pivot_col
+        count += 1
+        pivot_row += 1
+        pivot_col += 1
+    
+    return pivot_rows[:count], pivot_cols[:count], missing[:missing_count]
+
+def ForwardSubstitution(L, Y, unit_diagonal = False, return_status = False,
+                        backend = None, dtype = None):
+    '''
+    ForwardSubstitution(L, Y, unit_diagonal = False, return_status = False,
+                        backend = None, dtype = None)
+    (BSV)
+    
+    ForwardSubstitution performs forward substitution to find the solution
+    to a square lower triangular system LX = Y.  It is the counterpart of 
+    BackSubstitution, and Y may likewise hold k right hand sides as the 
+    columns of an mxk array.  If unit_diagonal is True, the diagonal 
+    entries of L are taken to be 1 and not used.  L may be a SciPy sparse
+    matrix.
+    
+    Zero entries in pivot positions of L are reported as in 
+    BackSubstitution, by a message or, if return_status is True, by a list
+    of the positions returned along with X, and X is still returned with
+    the rows at zero pivots left undivided.  The backend and dtype policy 
+    are used as in BackSubstitution.
+
+    Parameters
+    ----------
+    L : NumPy array object of dimension mxm
+    Y : NumPy array object of dimension mx1 or mxk
+    unit_diagonal: optional bool
+    return_status: optional bool
+    backend: optional string, 'numpy' or 'numba'
+    dtype: optional string, dtype policy
+
+    Returns
+    -------
+    X : NumPy array object of dimension mx1 or mxk
+    singular: list of ints, only if return_status is True
+    '''
+
+    m = L.shape[0]  # m is number of rows and columns in L
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    
+    if (IsSparse(L)):
+        L = sparse.csr_matrix(L,dtype='float64')
+        singular = []
+        if (not unit_diagonal):
+            singular = np.flatnonzero(L.diagonal() == 0).tolist()
+        if (len(singular) == 0):
+            Y = np.asarray(Y,dtype='float64').reshape((m,-1))
+            X = sparse_linalg.spsolve_triangular(L,Y,lower=True,
+                                                  unit_diagonal=unit_diagonal)
+        else:
+            X = np.array(Y,dtype='float64').reshape((m,-1))
+            diagonal = L.diagonal()
+            for i in range(m):  # Only the nonzero entries of row i
+                cols = L.indices[L.indptr[i]:L.indptr[i+1]]
+                vals = L.data[L.indptr[i]:L.indptr[i+1]]
+                X[i] -= vals[cols < i]@X[cols[cols < i]]
+                if (diagonal[i] != 0):
+                    X[i] /= diagonal[i]
+    elif (ActiveBackend(backend) == 'numba' and 
+          WorkingDtype(np.result_type(L,Y),dtype) == np.float64):
+        L = np.asarray(L,dtype='float64')
+        X = np.array(Y,dtype='float64').reshape((m,-1))
+        singular = SubstitutionKernel(L,X,True,unit_diagonal).tolist()
+    else:
+        working = WorkingDtype(np.result_type(L,Y),dtype)
+        L = np.asarray(L)
+        if (working == object):
+            L = WorkingCopy(L,working)
+        X = WorkingCopy(np.reshape(Y,(m,-1)),working)
+        singular = []
+        
+        for i in range(m):  # Calculate rows forward from 0 to m-1
+            X[i] -= L[i,:i]@X[:i]
+            if (unit_diagonal):
+                continue
+            if (L[i,i] != 0):
+                X[i] /= L[i,i]
+            else:
+                singular.append(i)
+    
+    if (profile is not None):
+        profile.Record('substitution',mark,row_operations=m,
+                       flops=m*m*X.shape[1],copied=X.nbytes)
+    if (return_status):
+        return X, singular
+    for i in singular:
+        print("Zero entry found in L pivot position",i,".")
+    return X
+
+def FullRowReduction(A, tol = 1e-14, pivoting = False, backend = None,
+                     dtype = None):
+    ''' 
+    FullRowReduction(A, tol = 1e-14, pivoting = False, backend = None,
+                     dtype = None)
+    
+    Produces RREF for matrix of any shape.  No pivot strategy implemented
+    unless pivoting is True, in which case partial pivoting is used.
+    Entries with abs value < tol are set to zero to account for roundoff
+    errors.  The steps of elimination are carried out by Elimination on a 
+    single working copy of A, with the given backend.  The type of the 
+    entries of the copy is chosen by the dtype policy.  With 'exact' there
+    is no roundoff, so tol is not used.
+    
+    Parameters
+    ----------
+    A : NumPy array object of dimension mxn
+    tol: optional float
+    pivoting: optional bool
+    backend: optional string, 'numpy' or 'numba'
+    dtype: optional string, dtype policy
+
+    Returns
+    -------
+    B: NumPy array object of dimension mxn
+    '''
+    
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    B = WorkingCopy(A,WorkingDtype(A.dtype,dtype))
+    if (profile is not None):
+        profile.Record('copy',mark,copied=B.nbytes)
+    if (B.dtype == object):
+        tol = 0
+    Elimination(B,rref=True,pivoting=pivoting,tol=tol,backend=backend)
+        
+    return B
+
+def GaussSeidel(A, B, X0 = None, tol = 1e-10, max_iter = 1000):
+    '''
+    GaussSeidel(A, B, X0 = None, tol = 1e-10, max_iter = 1000)
+    BSV:  Accepts both (n,1) and (n,) for B.  Returns shape (n,1)
+    
+    GaussSeidel solves AX=B with Gauss-Seidel iteration, where each entry of
+    X is updated in turn using the newest values of the others.  Iteration 
+    converges if A is strictly diagonally dominant or symmetric positive 
+    definite.  Iteration starts from X0, or from zero if X0 is not given, 
+    and stops when the relative residual |B-AX|/|B| is less than tol, or 
+    after max_iter steps.  A may be a SciPy sparse matrix.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn, or SciPy sparse matrix
+    B : NumPy array object of dimension nx1
+    X0: optional NumPy array object of dimension nx1
+    tol: optional float
+    max_iter: optional int
+
+    Returns
+    -------
+    X: NumPy array object of dimension nx1
+    residuals: list of relative residuals, one for each step
+    '''
+    B = np.asarray(B,dtype='float64').reshape((-1,1))
+    n = B.shape[0]
+    
+    if (X0 is None):
+        X = np.zeros((n,1))
+    else:
+        X = np.array(X0,dtype='float64').reshape((n,1))
+    
+    B_magnitude = Magnitude(B)
+    if (B_magnitude == 0):
+        B_magnitude = 1.
+    
+    if (IsSparse(A)):
+        A = sparse.csr_matrix(A,dtype='float64')
+        lower = sparse.tril(A,format='csr')
+        upper = sparse.triu(A,k=1,format='csr')
+    else:
+        A = np.asarray(A,dtype='float64')
+        diagonal = A.diagonal()
+    
+    residuals = [Magnitude(B - ApplyOperator(A,X))/B_magnitude]
+    
+    for k in range(max_iter):
+        if (residuals[-1] < tol):
+            break
+        if (IsSparse(A)):
+            # Solve (D+L)X = B - UX with the strictly upper part from the
+            # previous step
+            X = sparse_linalg.spsolve_triangular(lower,B - upper@X,lower=True)
+        else:
+            for i in range(n):
+                X[i] += (B[i] - A[i]@X)/diagonal[i]
+        residuals.append(Magnitude(B - ApplyOperator(A,X))/B_magnitude)
+    
+    return X, residuals
+
+def GMRES(A, B, X0 = None, tol = 1e-10, max_iter = None, restart = 50):
+    '''
+    GMRES(A, B, X0 = None, tol = 1e-10, max_iter = None, restart = 50)
+    BSV:  Accepts both (n,1) and (n,) for B.  Returns shape (n,1)
+    
+    GMRES solves AX=B with the generalized minimal residual method, which 
+    works for any invertible A.  At each step the residual is minimized 
+    over a growing Krylov subspace, which is discarded after restart steps
+    to limit memory.  Iteration starts from X0, or from zero if X0 is not 
+    given, and stops when the relative residual |B-AX|/|B| is less than 
+    tol, or after max_iter steps (n steps by default).  A may be a function
+    that returns AX.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn, SciPy sparse matrix, or function
+    B : NumPy array object of dimension nx1
+    X0: optional NumPy array object of dimension nx1
+    tol: optional float
+    max_iter: optional int
+    restart: optional int
+
+    Returns
+    -------
+    X: NumPy array object of dimension nx1
+    residuals: list of relative residuals, one for each step
+    '''
+    B = np.asarray(B,dtype='float64').reshape((-1,1))
+    n = B.shape[0]
+    if (max_iter is None):
+        max_iter = n
+    restart = min(restart,n)
+    
+    if (X0 is None):
+        X = np.zeros((n,1))
+    else:
+        X = np.array(X0,dtype='float64').reshape((n,1))
+    
+    B_magnitude = Magnitude(B)
+    if (B_magnitude == 0):
+        B_magnitude = 1.
+    
+    Res = B - ApplyOperator(A,X)
+    residuals = [Magnitude(Res)/B_magnitude]
+    
+    steps = 0
+    while (steps < max_iter and residuals[-1] >= tol):
+        beta = Magnitude(Res)
+        
+        # Orthonormal basis V of the Krylov subspace and Hessenberg matrix H
+        # with AV[:,:j] = V[:,:j+1]H[:j+1,:j].  Givens rotations reduce H to 
+        # triangular form as it is built, so the residual is known at each 
+        # step without solving the least squares problem.
+        V = np.zeros((n,restart+1),order='F')
+        H = np.zeros((restart+1,restart))
+        cosines = np.zeros(restart)
+        sines = np.zeros(restart)
+        G = np.zeros(restart+1)
+        G[0] = beta
+        V[:,0] = Res[:,0]/beta
+        
+        j = 0
+        while (j < restart and steps < max_iter):
+            W = ApplyOperator(A,V[:,j:j+1])[:,0]
+            # Modified Gram-Schmidt against the basis so far
+            for i in range(j+1):
+                H[i,j] = V[:,i]@W
+                W -= H[i,j]*V[:,i]
+            H[j+1,j] = Magnitude(W)
+            breakdown = (H[j+1,j] == 0)
+            if (not breakdown):
+                V[:,j+1] = W/H[j+1,j]
+            
+            # Apply the previous rotations to the new column of H
+            for i in range(j):
+                temp = cosines[i]*H[i,j] + sines[i]*H[i+1,j]
+                H[i+1,j] = -sines[i]*H[i,j] + cosines[i]*H[i+1,j]
+                H[i,j] = temp
+            
+            # New rotation to zero H[j+1,j]
+            denominator = math.hypot(H[j,j],H[j+1,j])
+            cosines[j] = H[j,j]/denominator
+            sines[j] = H[j+1,j]/denominator
+            H[j,j] = denominator
+            H[j+1,j] = 0
+            G[j+1] = -sines[j]*G[j]
+            G[j] = cosines[j]*G[j]
+            
+            j += 1
+            steps += 1
+            residuals.append(abs(G[j])/B_magnitude)
+            # The exact solution lies in the subspace if W was zero
+            if (residuals[-1] < tol or breakdown):
+                break
+        
+        # Update X with the least squares solution in the Krylov subspace
+        Y = BackSubstitution(H[:j,:j],G[:j],dtype='float64')
+        X += V[:,:j]@Y
+        Res = B - ApplyOperator(A,X)
+        residuals[-1] = Magnitude(Res)/B_magnitude
+    
+    return X, residuals
+
+def GraphLayout(A, edge_list = None):
+    '''
+    GraphLayout(A, edge_list = None)
+    
+    GraphLayout returns coordinates for the nodes of the directed graph with
+    adjacency matrix A, for use with DrawGraph and HighlightSubgraph.  The 
+    spring layout of NetworkX is used for graphs with fewer than 1000 nodes.
+    Its cost grows with the square of the number of nodes, so the spectral
+    layout, which needs only a few sparse eigenvectors, is used for larger 
+    graphs.  The coordinates are kept in layouts, keyed by the edges of the
+    graph, and reused the next time a graph with the same edges is drawn.
+    Only the max_layouts most recently used are kept, and ClearLayouts 
+    removes them all.  If the edge list of A is already known, it can be 
+    passed as edge_list.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension NxN
+    edge_list: optional list of (int,int) tuples
+
+    Returns
+    -------
+    pos: dictionary of node coordinates
+    '''
+    if (edge_list is None):
+        edge_list = EdgeList(A)
+    
+    edges = np.array(edge_list,dtype=np.int64).reshape((-1,2))
+    key = hashlib.blake2b(edges.tobytes(),digest_size=16,
+                          person=str(A.shape[0]).encode()).hexdigest()
+    if (key in layouts):
+        layouts.move_to_end(key)
+        return dict(layouts[key])
+    
+    G = nx.DiGraph()
+    G.add_edges_from(edge_list)
+    if (A.shape[0] < 1000):
+        layouts[key] = nx.spring_layout(G)
+    else:
+        layouts[key] = nx.spectral_layout(G)
+    while (len(layouts) > max_layouts):
+        layouts.popitem(last=False)
+    
+    return dict(layouts[key])
+
+def HighlightSubgraph(A,pos,subgraph,fast = None,filename = None):
+    '''
+    HighlightSubgraph(A,pos,subgraph,fast = None,filename = None)
+    
+    Draws directed graph based on adjacency matrix A, with node positions pos,
+    then colors a subgraph containing nodes in nodelist and edges connecting
+    connecting nodes in nodelist.  A may be a SciPy sparse matrix.  The 
+    graph is drawn as a single image by RenderGraph if fast is True, or by
+    default if it has 1000 or more nodes, and written to filename if it is
+    given, as in DrawGraph.
+
+    Parameters
+    ----------
+    A : NumPy array object
+    
+    pos : dictionary of node positions
+    
+    nodelist : list of ints representing the nodes in the subgraph
+    
+    fast : optional bool
+    
+    filename : optional string
+
+    Returns
+    -------
+    None.
+
+    '''
+    edge_list = EdgeList(A)
+    if (fast is None):
+        fast = (A.shape[0] >= 1000)
+    
+    if (fast):
+        image = RenderGraph(pos,edge_list,subgraph=subgraph)
+        if (filename is None):
+            plt.figure(figsize=(6,6))
+            plt.imshow(image)
+            plt.axis('off')
+        else:
+            plt.imsave(filename,image)
+        return
+    
+    plt.figure(figsize=(6,6))
+    G = nx.DiGraph()
+    
+    nodes = set(subgraph)
+    subgraph_edges = [edge for edge in edge_list 
+                      if edge[0] in nodes and edge[1] in nodes]
+
+    G.add_edges_from(edge_list)
+    
+    options = {"with_labels": True,"font_size":20}
+    nx.draw(G, pos,connectionstyle='arc3, rad = 0.1',arrowsize=30,**options)
+    
+    node_options = {"node_color":'r',"node_size" : 400}
+    nx.draw_networkx_nodes(G, pos, nodelist=subgraph, **node_options)
+
+    
+    edge_options = {"width" : 8,"alpha" : 0.5, "edge_color" : 'r',
+                    "connectionstyle":"arc3, rad=0.1"}    
+    nx.draw_networkx_edges(G,pos,edgelist=subgraph_edges, **edge_options)
+
+@Cached
+def Inverse(A, dtype = None):
+    '''
+    Inverse(A, dtype = None)
+    
+    A is a NumPy array that represents a matrix of dimension n x n.
+    Inverse computes the inverse matrix by solving AX=I where I is the identity.
+    If A is not invertible, Inverse will not return correct results.  The 
+    dtype policy is used as in SolveSystem.
+
+    Parameters
+    ----------
+    A: NumPy array object of dimension nxn
+    dtype: optional string, dtype policy
+    
+    Returns
+    -------
+    Inverse: NumPy array object of dimension nxn
+    '''
+
+    # Check shape of A
+    if (A.shape[0] != A.shape[1]):
+        print("Inverse accepts only square arrays.")
+        return
+    n = A.shape[0]  # n is number of rows and columns in A
+    
+    if (ActiveDtypePolicy(dtype) == 'mixed'):
+        return LUFactorization(A,dtype='mixed').Inverse()
+
+    I = np.eye(n)
+    
+    # The augmented matrix is A together with all the columns of I.  RowReduction is
+    # carried out simultaneously for all n systems.
+    A_augmented = WorkingCopy(np.hstack((A,I)),WorkingDtype(A.dtype,dtype))
+    R = RowReduction(A_augmented,out=A_augmented)
+    
+    # Now BackSubstitution is carried out for all n columns at once.
+    A_reduced = R[:,0:n]
+    B_reduced = R[:,n:2*n]
+    Inverse = BackSubstitution(A_reduced,B_reduced,dtype=dtype)
+    
+    return(Inverse)
+
+
+
+def InverseIteration(A, shift = 0., X0 = None, tol = 1e-10, max_iter = 1000,
+                     LU = None):
+    '''
+    InverseIteration(A, shift = 0., X0 = None, tol = 1e-10, max_iter = 1000,
+                     LU = None)
+    
+    InverseIteration finds the eigenvalue of A closest to shift, and a unit
+    eigenvector, by power iteration with the inverse of A - shift*I.  The 
+    matrix A - shift*I is factored once, and each step is a solve with the 
+    factors.  A factorization from an earlier call can be passed as LU, 
+    either an LUFactors object from LUFactorization(A - shift*I) or, for
+    sparse A, a SuperLU object from scipy.sparse.linalg.splu.  Iteration 
+    starts from X0 and stops when |AX - tX| < tol|t|.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn, or SciPy sparse matrix
+    shift: optional float
+    X0: optional NumPy array object of dimension nx1
+    tol: optional float
+    max_iter: optional int
+    LU: optional LUFactors or SuperLU object
+
+    Returns
+    -------
+    eigenvalue: float
+    X: NumPy array object of dimension nx1
+    '''
+    n = A.shape[0]
+    
+    if (LU is None):
+        if (IsSparse(A)):
+            shifted = sparse.csc_matrix(A - shift*sparse.identity(n),dtype='float64')
+            LU = sparse_linalg.splu(shifted)
+        else:
+            LU = LUFactorization(A - shift*np.eye(n),dtype='float64')
+    if (isinstance(LU,LUFactors)):
+        Solve = LU.Solve
+    else:
+        Solve = LU.solve
+    
+    if (X0 is None):
+        X0 = np.random.default_rng(0).standard_normal(n)
+    X = np.asarray(X0,dtype='float64').reshape((n,1))
+    X = X/Magnitude(X)
+    
+    for k in range(max_iter):
+        Y = np.asarray(Solve(X)).reshape((n,1))
+        X = Y/Magnitude(Y)
+        AX = ApplyOperator(A,X)
+        eigenvalue = DotProduct(X,AX)
+        if (Magnitude(AX - eigenvalue*X) < tol*abs(eigenvalue)):
+            break
+    
+    return eigenvalue, X
+
+def IsSparse(A):
+    '''
+    IsSparse(A)
+    
+    Returns True if A is a SciPy sparse matrix or array.  Always returns 
+    False when SciPy is not installed.
+
+    Parameters
+    ----------
+    A : NumPy array object or SciPy sparse matrix
+
+    Returns
+    -------
+    True or False
+    '''
+    return (sparse is not None and sparse.issparse(A))
+
+def Jacobi(A, B, X0 = None, tol = 1e-10, max_iter = 1000, diagonal = None):
+    '''
+    Jacobi(A, B, X0 = None, tol = 1e-10, max_iter = 1000, diagonal = None)
+    BSV:  Accepts both (n,1) and (n,) for B.  Returns shape (n,1)
+    
+    Jacobi solves AX=B with Jacobi iteration, where all entries of X are 
+    updated at once using the residual divided by the diagonal of A.
+    Iteration converges if A is strictly diagonally dominant.  Iteration 
+    starts from X0, or from zero if X0 is not given, and stops when the 
+    relative residual |B-AX|/|B| is less than tol, or after max_iter steps.
+    A may be a function that returns AX, in which case the diagonal of A 
+    must be given.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn, SciPy sparse matrix, or function
+    B : NumPy array object of dimension nx1
+    X0: optional NumPy array object of dimension nx1
+    tol: optional float
+    max_iter: optional int
+    diagonal: optional NumPy array object of dimension n
+
+    Returns
+    -------
+    X: NumPy array object of dimension nx1
+    residuals: list of relative residuals, one for each step
+    '''
+    B = np.asarray(B,dtype='float64').reshape((-1,1))
+    n = B.shape[0]
+    
+    if (diagonal is None):
+        if (callable(A)):
+            print("Jacobi requires the diagonal when A is a function.")
+            return None
+        diagonal = A.diagonal()
+    diagonal = np.asarray(diagonal,dtype='float64').reshape((n,1))
+    
+    if (X0 is None):
+        X = np.zeros((n,1))
+    else:
+        X = np.array(X0,dtype='float64').reshape((n,1))
+    
+    B_magnitude = Magnitude(B)
+    if (B_magnitude == 0):
+        B_magnitude = 1.
+    
+    Res = B - ApplyOperator(A,X)
+    residuals = [Magnitude(Res)/B_magnitude]
+    
+    for k in range(max_iter):
+        if (residuals[-1] < tol):
+            break
+        X += Res/diagonal
+        Res = B - ApplyOperator(A,X)
+        residuals.append(Magnitude(Res)/B_magnitude)
+    
+    return X, residuals
+
+def LUFactorization(A, pivoting = True, workers = None, dtype = None):
+    '''
+    LUFactorization(A, pivoting = True, workers = None, dtype = None)
+    
+    LUFactorization carries out the elimination used by RowReduction once 
+    on the nxn array A and stores the result as an LUFactors object.  The
+    factors can then be used to solve AX=B for any number of right hand
+    sides, or to compute the inverse, without repeating the elimination.
+    Partial pivoting is used unless pivoting is False.  If more than one 
+    worker is used, the elimination is carried out by BlockedElimination.
+    The factors have the type of entries chosen by the dtype policy.
+    
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn
+    pivoting: optional bool
+    workers: optional int, number of threads
+    dtype: optional string, dtype policy
+    
+    Returns
+    -------
+    LU: LUFactors object
+    '''
+    # Check shape of A
+    if (A.shape[0] != A.shape[1]):
+        print("LUFactorization accepts only square arrays.")
+        return None
+    
+    return LUFactors(A,pivoting,workers,dtype)
+
+class LUFactors:
+    '''
+    LUFactors(A, pivoting = True, workers = None, dtype = None)
+    
+    Factors of the nxn array A produced by the steps of elimination in
+    RowReduction.  The rows of A in the order given by perm satisfy
+    A[perm] = L@U.  L is lower triangular and holds the pivots on its 
+    diagonal, and U is upper triangular with ones on its diagonal, which is
+    the row echelon form computed by RowReduction.
+    
+    The type of the entries of L and U is chosen by the dtype policy.  With
+    'mixed', the factors are float32 and A itself is kept, so that Solve can
+    refine each solution in float64.
+    
+    Rank one changes A + uv^T made with Update are not applied to L and U,
+    but kept in updates and included in every solve with the 
+    Sherman-Morrison formula.  After a number of updates, the factors are 
+    computed again for the changed A.
+    
+    Attributes
+    ----------
+    L : NumPy array object of dimension nxn
+    U : NumPy array object of dimension nxn
+    perm : NumPy array object of dimension n
+    policy : string, the dtype policy
+    updates : list of (u,v,z,d) tuples, see Update
+    '''
+    
+    def __init__(self, A, pivoting = True, workers = None, dtype = None):
+        n = A.shape[0]  # n is number of rows and columns in A
+        
+        self.pivoting = pivoting
+        self.workers = workers
+        self.updates = []
+        self.policy = ActiveDtypePolicy(dtype)
+        if (self.policy == 'mixed'):
+            self.A = A
+        
+        B = WorkingCopy(A,WorkingDtype(A.dtype,self.policy))
+        self.L = np.zeros((n,n),dtype=B.dtype)
+        self.perm = np.arange(n)
+        if (ActiveWorkers(workers) > 1):
+            BlockedElimination(B,pivoting=pivoting,L=self.L,perm=self.perm,
+                               workers=workers)
+        else:
+            Elimination(B,pivoting=pivoting,L=self.L,perm=self.perm)
+        self.U = np.triu(B)
+        
+    def Solve(self, B, max_refine = 10):
+        '''
+        Solve(B, max_refine = 10)
+        BSV:  Accepts (n,1) and (n,) for B, returning shape (n,1).  An (n,k)
+        array of right hand sides returns shape (n,k).
+        
+        Solve computes the solution to AX=B using the stored factors, by 
+        forward substitution with L and back substitution with U.
+        
+        With the 'mixed' dtype policy, the substitutions are carried out in 
+        float32 and the solution is improved by iterative refinement: the 
+        residual B-AX is computed in float64 and the correction is found 
+        with the same factors, until it no longer changes X in float64.  
+        Each step costs only O(n^2), and for systems that are not badly 
+        conditioned the result has float64 accuracy.
+        
+        Parameters
+        ----------
+        B : NumPy array object of dimension nx1 or nxk
+        max_refine: optional int, number of steps of refinement for 'mixed'
+        
+        Returns
+        -------
+        X: NumPy array object of dimension nx1 or nxk
+        '''
+        n = self.U.shape[0]
+        
+        if (self.policy == 'mixed'):
+            B = np.asarray(B,dtype='float64').reshape((n,-1))
+            X = self.Substitute(B).astype('float64')
+            for step in range(max_refine):
+                Residual = B - self.A@X
+                for u, v, z, d in self.updates:
+                    Residual -= np.outer(u,v@X)
+                D = self.Substitute(Residual)
+                X += D
+                if (np.max(np.abs(D)) <= np.finfo('float64').eps*np.max(np.abs(X))):
+                    break
+            return X
+        
+        if (self.U.dtype == object):
+            B = WorkingCopy(np.reshape(B,(n,-1)),self.U.dtype)
+        else:
+            B = np.asarray(B,dtype=np.result_type(self.U,'float32')).reshape((n,-1))
+        
+        return self.Substitute(B)
+    
+    def Substitute(self, B):
+        '''
+        Substitute(B)
+        
+        Substitute solves AX=B with one forward substitution with L on the 
+        rows of B in the order given by perm, and one back substitution with 
+        U, in the type of the entries of the factors.  The updates are then
+        applied to the solution one at a time.
+        
+        Parameters
+        ----------
+        B : NumPy array object of dimension nxk
+        
+        Returns
+        -------
+        X: NumPy array object of dimension nxk
+        '''
+        Y = ForwardSubstitution(self.L,B[self.perm],dtype=self.policy)
+        X = BackSubstitution(self.U,Y,dtype=self.policy)
+        
+        # Sherman-Morrison: if A' = A + uv^T and z solves Az = u, then the 
+        # solution of A'X = B is X - z(v^T X)/(1 + v^T z)
+        for u, v, z, d in self.updates:
+            X -= np.outer(z,v@X)/d
+        
+        return X
+    
+    def Update(self, u, v, refactor_every = None):
+        '''
+        Update(u, v, refactor_every = None)
+        
+        Update changes the factored array A to A + uv^T, at a cost of one 
+        solve instead of a new factorization.  The solution z of Az = u and
+        d = 1 + v^T z are stored in updates.  Each stored update adds O(n) 
+        to the cost of a solve, and roundoff error grows with the number of 
+        updates, so after refactor_every updates (n/4 and at least 8 by 
+        default) Refactor is called.  Replacing row i of A with r is the 
+        update with u the ith column of I and v = r - A[i].
+        
+        If the change would make A singular (d = 0), it is not made and a 
+        message is printed.
+        
+        Parameters
+        ----------
+        u : NumPy array object of dimension n
+        v : NumPy array object of dimension n
+        refactor_every: optional int
+        
+        Returns
+        -------
+        None
+        '''
+        n = self.U.shape[0]
+        
+        if (self.U.dtype == object):
+            u = WorkingCopy(np.ravel(u),self.U.dtype)
+            v = WorkingCopy(np.ravel(v),self.U.dtype)
+        else:
+            u = np.asarray(u,dtype='float64').reshape(n)
+            v = np.asarray(v,dtype='float64').reshape(n)
+        
+        z = self.Substitute(u.reshape((n,1))).reshape(n)
+        d = 1 + v@z
+        if (d == 0):
+            print("The update would make the matrix singular.")
+            return
+        self.updates.append((u,v,z,d))
+        
+        if (refactor_every is None):
+            refactor_every = max(8,n//4)
+        if (len(self.updates) >= refactor_every):
+            self.Refactor()
+    
+    def Refactor(self):
+        '''
+        Refactor()
+        
+        Refactor computes the factors again for A with all the updates 
+        included, and clears updates.  With the 'mixed' policy, the kept A 
+        is used, and otherwise A is formed from the factors.
+        
+        Returns
+        -------
+        None
+        '''
+        n = self.U.shape[0]
+        
+        if (self.policy == 'mixed'):
+            A = np.array(self.A,dtype='float64')
+        else:
+            A = np.empty((n,n),dtype=self.U.dtype)
+            A[self.perm] = self.L@self.U
+        for u, v, z, d in self.updates:
+            A += np.outer(u,v)
+        
+        self.__init__(A,self.pivoting,self.workers,self.policy)
+    
+    def Inverse(self):
+        '''
+        Inverse()
+        
+        Inverse computes the inverse of A by solving AX=I with the stored 
+        factors.
+        
+        Returns
+        -------
+        Inverse: NumPy array object of dimension nxn
+        '''
+        return self.Solve(np.eye(self.U.shape[0]))
+    
+    def Determinant(self):
+        '''
+        Determinant()
+        
+        Determinant computes det A as the product of the pivots stored on the
+        diagonal of L, with the sign of the row permutation.  Each update
+        multiplies the determinant by its d, since 
+        det(A + uv^T) = (1 + v^T A^{-1} u) det A.
+        
+        Returns
+        -------
+        D: float
+        '''
+        n = self.perm.shape[0]
+        
+        # The sign of the permutation is (-1)**(n - number of cycles)
+        visited = np.zeros(n,dtype=bool)
+        cycles = 0
+        for i in range(n):
+            if (not visited[i]):
+                cycles += 1
+                j = i
+                while (not visited[j]):
+                    visited[j] = True
+                    j = self.perm[j]
+        sign = (-1)**(n-cycles)
+        
+        D = sign*np.prod(np.diag(self.L))*np.prod(np.diag(self.U))
+        for u, v, z, d in self.updates:
+            D *= d
+        
+        return D
+
+def Lanczos(A, k, X0 = None, tol = 1e-10, max_restarts = 100, subspace = None):
+    '''
+    Lanczos(A, k, X0 = None, tol = 1e-10, max_restarts = 100, subspace = None)
+    
+    Lanczos computes the k eigenvalues of largest absolute value, and their
+    eigenvectors, for a symmetric matrix A.  It is Arnoldi with symmetric 
+    set to True; see Arnoldi for a description of the parameters.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn, SciPy sparse matrix, or function
+    k : int
+    X0: optional NumPy array object of dimension nx1
+    tol: optional float
+    max_restarts: optional int
+    subspace: optional int
+
+    Returns
+    -------
+    eigenvalues: NumPy array object of dimension k
+    X: NumPy array object of dimension nxk
+    '''
+    return Arnoldi(A,k,X0,tol,max_restarts,subspace,symmetric=True)
+
+def LeastSquares(A, B, weights = None, method = 'householder'):
+    '''
+    LeastSquares(A, B, weights = None, method = 'householder')
+    BSV:  Accepts (m,1) and (m,) for B, returning shape (n,1).  An (m,k) 
+    array of right hand sides returns shape (n,k).
+    
+    LeastSquares computes the least squares solution X of AX=B, which 
+    minimizes the magnitude of B-AX, for an mxn array A with m >= n.  
+    Instead of solving the normal equations (A^T A)X = A^T B, which squares
+    the condition number of A, it uses the factorization A=QR from 
+    QRFactorization and solves RX = Q^T B by back substitution.  All the 
+    columns of B are solved together with the same factorization.
+    
+    If weights is given, the sum of weights[i] times the square of entry i
+    of B-AX is minimized, by scaling row i of A and B by the square root of
+    weights[i].  method is passed to QRFactorization, and can be 'tsqr' for
+    an A that is stored in an np.memmap array.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension mxn
+    B : NumPy array object of dimension mx1 or mxk
+    weights: optional NumPy array object of dimension m
+    method: optional string, 'householder', 'tsqr' or 'modified'
+
+    Returns
+    -------
+    X: NumPy array object of dimension nx1 or nxk
+    '''
+    m = A.shape[0]  # m is number of rows in A
+    
+    B = np.asarray(B,dtype='float64').reshape((m,-1))
+    if (weights is not None):
+        scale = np.sqrt(np.asarray(weights,dtype='float64')).reshape((m,1))
+        A = scale*A
+        B = scale*B
+    
+    factors = QRFactorization.__wrapped__(A,method)
+    if (factors is None):
+        return None
+    Q, R = factors
+    
+    return BackSubstitution(R,Q.transpose()@B,dtype='float64')
+
+class IncrementalLeastSquares:
+    '''
+    IncrementalLeastSquares(A, B, weights = None)
+    BSV:  Accepts (m,1) and (m,) for B.
+    
+    Least squares solution of AX=B that can be updated as rows of A and B 
+    arrive or are removed, without factoring all of the rows again.  Only R
+    from the factorization A=QR and the product C=Q^T B are stored, along 
+    with the sum of squares of the residual B-AX for each column of B.  The
+    cost of each update depends on n and on the number of rows added or 
+    removed, but not on the number of rows in the problem.  Rows can be 
+    weighted as in LeastSquares.
+    
+    A may have fewer than n rows at first.  Solve gives correct results 
+    once the rows added so far have n independent columns.
+    
+    Attributes
+    ----------
+    R : NumPy array object of dimension nxn
+    C : NumPy array object of dimension nxk
+    residual : NumPy array object of dimension k
+    rows : int, number of rows in the problem
+    '''
+    
+    def __init__(self, A, B, weights = None):
+        n = A.shape[1]  # n is number of columns in A
+        k = np.reshape(B,(A.shape[0],-1)).shape[1]
+        
+        self.R = np.zeros((n,n))
+        self.C = np.zeros((n,k))
+        self.residual = np.zeros(k)
+        self.rows = 0
+        self.AddRows(A,B,weights)
+    
+    def AddRows(self, A, B, weights = None):
+        '''
+        AddRows(A, B, weights = None)
+        
+        AddRows includes the rows of A and B in the least squares problem.
+        A few rows are added one at a time with AddRow.  For more rows than
+        n/8, the stacked array of R and the new rows of A is factored with 
+        Householder reflections instead, and the same reflections are 
+        applied to C and the new rows of B.
+        
+        Parameters
+        ----------
+        A : NumPy array object of dimension pxn
+        B : NumPy array object of dimension px1 or pxk
+        weights: optional NumPy array object of dimension p
+        
+        Returns
+        -------
+        None
+        '''
+        p = A.shape[0]  # p is number of new rows
+        n = self.R.shape[0]
+        
+        A, B = self.WeightedRows(A,B,weights)
+        
+        if (p <= n//8):
+            for i in range(p):
+                self.AddRow(A[i],B[i])
+            return
+        
+        Q, self.R = QRFactorization.__wrapped__(np.vstack((self.R,A)),'householder')
+        stacked = np.vstack((self.C,B))
+        self.C = Q.transpose()@stacked
+        
+        # The part of the stacked right hand sides outside the column space
+        # of Q is added to the residual
+        self.residual += np.sum(stacked**2,axis=0) - np.sum(self.C**2,axis=0)
+        self.rows += p
+    
+    def AddRow(self, a, b):
+        '''
+        AddRow(a, b)
+        
+        AddRow includes one row a of A and the matching row b of B, with 
+        Givens rotations that combine a with each row of R in turn to 
+        create zeros in a.  The cost is O(n^2).  What remains of b after the
+        same rotations is added to the residual.
+        
+        Parameters
+        ----------
+        a : NumPy array object of dimension n
+        b : NumPy array object of dimension k
+        
+        Returns
+        -------
+        None
+        '''
+        n = self.R.shape[0]
+        
+        a = np.array(a,dtype='float64').reshape(n)
+        b = np.array(b,dtype='float64').reshape(-1)
+        
+        for j in range(n):
+            if (a[j] == 0):
+                continue
+            # Rotation that maps (R[j,j],a[j]) to (r,0)
+            r = math.hypot(self.R[j,j],a[j])
+            c = self.R[j,j]/r
+            s = a[j]/r
+            R_row = self.R[j,j:].copy()
+            self.R[j,j:] = c*R_row + s*a[j:]
+            a[j:] = c*a[j:] - s*R_row
+            C_row = self.C[j].copy()
+            self.C[j] = c*C_row + s*b
+            b = c*b - s*C_row
+        
+        self.residual += b**2
+        self.rows += 1
+    
+    def DeleteRows(self, A, B, weights = None):
+        '''
+        DeleteRows(A, B, weights = None)
+        
+        DeleteRows removes rows of A and B that were added before, with the
+        same weights, one at a time with DeleteRow.
+        
+        Parameters
+        ----------
+        A : NumPy array object of dimension pxn
+        B : NumPy array object of dimension px1 or pxk
+        weights: optional NumPy array object of dimension p
+        
+        Returns
+        -------
+        None
+        '''
+        A, B = self.WeightedRows(A,B,weights)
+        
+        for i in range(A.shape[0]):
+            if (not self.DeleteRow(A[i],B[i])):
+                return
+    
+    def DeleteRow(self, a, b):
+        '''
+        DeleteRow(a, b)
+        
+        DeleteRow removes a row a of A and the matching row b of B that were
+        added before.  R is downdated so that R^T R loses aa^T, as for a 
+        Cholesky factor: with R^T p = a and alpha = sqrt(1 - p^T p), Givens
+        rotations that map (alpha,p) to (1,0) are applied to R with a row of
+        zeros above it.  That row becomes a^T and the rest is the new R.  
+        The new C solves R^T C = R^T C - ab^T with the old R on the right, 
+        and the residual loses e^2/alpha^2, where e = b - p^T C is the 
+        residual of the row.  The cost is O(n^2).
+        
+        Removing rows is less stable than adding them.  If p^T p >= 1, the 
+        row cannot be removed, a message is printed and nothing is changed.
+        
+        Parameters
+        ----------
+        a : NumPy array object of dimension n
+        b : NumPy array object of dimension k
+        
+        Returns
+        -------
+        removed: bool
+        '''
+        n = self.R.shape[0]
+        
+        a = np.asarray(a,dtype='float64').reshape(n)
+        b = np.asarray(b,dtype='float64').reshape(-1)
+        
+        p, singular = ForwardSubstitution(self.R.transpose(),a,
+                                          return_status=True,dtype='float64')
+        p = p.reshape(n)
+        if (len(singular) > 0 or p@p >= 1):
+            print("The row could not be removed.")
+            return False
+        alpha = math.sqrt(1 - p@p)
+        
+        e = b - p@self.C
+        RC = self.R.transpose()@self.C - np.outer(a,b)
+        
+        top = np.zeros(n)
+        t = alpha
+        for i in range(n-1,-1,-1):
+            # Rotation that maps (t,p[i]) to (r,0)
+            r = math.hypot(t,p[i])
+            c = t/r
+            s = p[i]/r
+            t = r
+            R_row = self.R[i,i:].copy()
+            self.R[i,i:] = c*R_row - s*top[i:]
+            top[i:] = c*top[i:] + s*R_row
+        
+        self.C = ForwardSubstitution(self.R.transpose(),RC,dtype='float64')
+        self.residual = np.maximum(self.residual - (e/alpha)**2,0)
+        self.rows -= 1
+        return True
+    
+    def WeightedRows(self, A, B, weights = None):
+        '''
+        WeightedRows(A, B, weights = None)
+        
+        WeightedRows returns A and B as float64 arrays, with row i scaled by
+        the square root of weights[i] if weights is given.
+        
+        Returns
+        -------
+        A: NumPy array object of dimension pxn
+        B: NumPy array object of dimension pxk
+        '''
+        p = A.shape[0]
+        
+        A = np.asarray(A,dtype='float64')
+        B = np.asarray(B,dtype='float64').reshape((p,-1))
+        if (weights is not None):
+            scale = np.sqrt(np.asarray(weights,dtype='float64')).reshape((p,1))
+            A = scale*A
+            B = scale*B
+        
+        return A, B
+    
+    def Solve(self):
+        '''
+        Solve()
+        
+        Solve computes the least squares solution for all the rows in the 
+        problem, by back substitution with R.
+        
+        Returns
+        -------
+        X: NumPy array object of dimension nxk
+        '''
+        return BackSubstitution(self.R,self.C,dtype='float64')
+
+def Magnitude(U):
+    ''' 
+    Magnitude(U)
+    BSV:  Accepts both (n,1) and (n,) for U.  Returns a float.
+    
+    Magnitude computes the magnitude of U based on the Euclidean inner 
+    product.  If U is an nxk array, the magnitudes of all k columns are 
+    computed together and returned as an array of dimension k.
+    
     Parameters
     ----------
-    A : NumPy array object
-    
-    pos : dictionary of node positions
+    U : NumPy array object of dimension nx1 or nxk
     
-    nodelist : list of ints representing the nodes in the subgraph
-
     Returns
     -------
-    None.
-
+    magnitude: float, or NumPy array object of dimension k
     '''
-    plt.figure(figsize=(6,6))
-    G = nx.DiGraph()
-    
-    N = A.shape[0]
-    edge_list = []
-    subgraph_edges = []
-    
-    for i in range(N):
-        for j in range(N):
-            if(A[i,j] == 1):
-                edge_list.append((i,j))
- 
-    for edge in edge_list:           
-        if (edge[0] in subgraph and edge[1] in subgraph):
-                    subgraph_edges.append(edge)
-    
-
-    G.add_edges_from(edge_list)
-    
-    options = {"with_labels": True,"font_size":20}
-    nx.draw(G, pos,connectionstyle='arc3, rad = 0.1',arrowsize=30,**options)
     
-    node_options = {"node_color":'r',"node_size" : 400}
-    nx.draw_networkx_nodes(G, pos, nodelist=subgraph, **node_options)
+    if (U.ndim == 1 or U.shape[1] == 1):
+        magnitude = math.sqrt(DotProduct(U,U))
+    else:
+        magnitude = np.sqrt(DotProduct(U,U))
+    return magnitude    
 
+def OrthogonalityError(Q):
+    ''' 
+    OrthogonalityError(Q)
     
-    edge_options = {"width" : 8,"alpha" : 0.5, "edge_color" : 'r',
-                    "connectionstyle":"arc3, rad=0.1"}    
-    nx.draw_networkx_edges(G,pos,edgelist=subgraph_edges, **edge_options)
-
-def Inverse(A):
-    '''
-    Inverse(A)
+    OrthogonalityError measures how far the columns of Q are from being 
+    orthonormal by computing the Frobenius norm of Q^TQ - I.  It can be 
+    used to compare the accuracy of the methods in QRFactorization.
     
-    A is a NumPy array that represents a matrix of dimension n x n.
-    Inverse computes the inverse matrix by solving AX=I where I is the identity.
-    If A is not invertible, Inverse will not return correct results.
-
     Parameters
     ----------
-    A: NumPy array object of dimension nxn
+    Q : NumPy array object of dimension mxn
     
     Returns
     -------
-    Inverse: NumPy array object of dimension nxn
+    error: float
     '''
+    n = Q.shape[1]
+    return np.linalg.norm(Q.transpose()@Q - np.eye(n))
 
-    # Check shape of A
-    if (A.shape[0] != A.shape[1]):
-        print("Inverse accepts only square arrays.")
-        return
-    n = A.shape[0]  # n is number of rows and columns in A
-
-    I = np.eye(n)
-    
-    # The augmented matrix is A together with all the columns of I.  RowReduction is
-    # carried out simultaneously for all n systems.
-    A_augmented = np.hstack((A,I))
-    R = RowReduction(A_augmented)
-    
-    Inverse = np.zeros((n,n))
-    
-    # Now BackSubstitution is carried out for each column and the result is stored 
-    # in the corresponding column of Inverse.
-    A_reduced = R[:,0:n]
-    for i in range(0,n):
-        B_reduced = R[:,n+i:n+i+1]
-        Inverse[:,i:i+1] = BackSubstitution(A_reduced,B_reduced)
+def PowerIteration(A, X0 = None, tol = 1e-10, max_iter = 1000):
+    '''
+    PowerIteration(A, X0 = None, tol = 1e-10, max_iter = 1000)
     
-    return(Inverse)
-
+    PowerIteration finds the eigenvalue of A with largest absolute value, 
+    and a unit eigenvector, by repeated multiplication by A.  The 
+    eigenvalue estimate at each step is the Rayleigh quotient X^TAX.  
+    Iteration starts from X0 and stops when |AX - tX| < tol|t|.  A may be 
+    a SciPy sparse matrix or a function that returns AX, in which case X0
+    is required.
 
-
-def Magnitude(U):
-    ''' 
-    Magnitude(U)
-    
-    Magnitude computes the magnitude of U based on the Euclidean inner product
-    
     Parameters
     ----------
-    U : NumPy array object of dimension nx1
-    
+    A : NumPy array object of dimension nxn, SciPy sparse matrix, or function
+    X0: optional NumPy array object of dimension nx1
+    tol: optional float
+    max_iter: optional int
+
     Returns
     -------
-    product: float
+    eigenvalue: float
+    X: NumPy array object of dimension nx1
     '''
-    # Check shape of U
-    if (U.shape[1] != 1):
-        print("Magnitude only accepts column vectors.")
-        return
-    
-    magnitude = math.sqrt(DotProduct(U,U))
-    return magnitude    
-
-def QRFactorization(A):
+    if (X0 is None):
+        if (callable(A)):
+            print("PowerIteration requires X0 when A is a function.")
+            return None
+        X0 = np.random.default_rng(0).standard_normal(A.shape[0])
+    X = np.asarray(X0,dtype='float64').reshape((-1,1))
+    X = X/Magnitude(X)
+    
+    AX = ApplyOperator(A,X)
+    for k in range(max_iter):
+        eigenvalue = DotProduct(X,AX)
+        if (Magnitude(AX - eigenvalue*X) < tol*abs(eigenvalue)):
+            break
+        X = AX/Magnitude(AX)
+        AX = ApplyOperator(A,X)
+    
+    return eigenvalue, X
+
+@Cached
+def QRFactorization(A, method = 'classical', block_size = None, workers = None,
+                    Q_out = None):
     ''' 
-    QRFactorization(A)
+    QRFactorization(A, method = 'classical', block_size = None, workers = None,
+                    Q_out = None)
     
     A is a Numpy array that represents a matrix of dimension m x n.
     QRFactorization returns matrices Q and R such that A=QR, Q is orthogonal
-    and R is upper triangular.  The factorization is carried out using classical
-    Gram-Schmidt and the results may suffer due to numerical instability.
+    and R is upper triangular.  The entries of R are computed during the 
+    factorization.  The method is chosen with method.
+    
+    'classical': Classical Gram-Schmidt.  The results may suffer due to 
+        numerical instability.
+    'modified': Modified Gram-Schmidt, which removes the projection onto 
+        each column of Q from all remaining columns as soon as it is found.
+    'householder': Householder reflections, which give Q orthogonal to 
+        machine precision.  The reflections are applied in blocks of 32
+        columns with matrix products.
+    'tsqr': Tall-skinny QR.  The rows of A are split into blocks of 
+        block_size rows, each block is factored with Householder reflections
+        and the stacked R factors are factored again.  Only one block of A is
+        read at a time, so A can be an np.memmap array stored on disk.  Q is
+        written to Q_out if it is given, which can also be an np.memmap 
+        array.  The default block_size keeps the blocks and the stacked R 
+        factors about the same size.
+    
+    For 'householder' and 'tsqr', the work can be split among several 
+    threads with workers.  The block reflectors are applied to tiles of 
+    columns, and the row blocks of 'tsqr' are factored at the same time.
+    
     QRFactorization may not return correct results if the columns of A are 
-    linearly dependent.
+    linearly dependent.  OrthogonalityError(Q) can be used to compare the 
+    accuracy of the methods.
     
     Parameters
     ----------
     A : NumPy array object of dimension mxn
+    method: optional string
+    block_size: optional int, number of rows in each block for 'tsqr'
+    workers: optional int, number of threads
+    Q_out: optional NumPy array object of dimension mxn, used for 'tsqr'
     
     Returns
     -------
@@ -404,19 +3016,236 @@ def QRFactorization(A):
     m = A.shape[0]
     n = A.shape[1]
     
-    Q = np.zeros((m,n))
     R = np.zeros((n,n))
     
-    for i in range(n):
-        W = A[:,i:i+1]
-        for j in range(i):
-                W = W - DotProduct(A[:,i:i+1],Q[:,j:j+1])*Q[:,j:j+1]
-        Q[:,i:i+1] = W/Magnitude(W)
+    if (method == 'classical'):
+        Q = np.zeros((m,n),order='F')
+        for i in range(n):
+            # Project the original column i onto all previous columns of Q
+            R[:i,i] = Q[:,:i].transpose()@A[:,i]
+            W = A[:,i] - Q[:,:i]@R[:i,i]
+            R[i,i] = Magnitude(W)
+            Q[:,i] = W/R[i,i]
+        
+    elif (method == 'modified'):
+        Q = np.array(A,dtype='float64')
+        for i in range(n):
+            R[i,i] = Magnitude(Q[:,i])
+            Q[:,i] /= R[i,i]
+            # Remove the projection onto column i from the remaining columns
+            R[i,i+1:] = Q[:,i]@Q[:,i+1:]
+            Q[:,i+1:] -= np.outer(Q[:,i],R[i,i+1:])
+        
+    elif (method == 'householder'):
+        # The columns are processed in panels of panel_size columns.  The 
+        # reflections for a panel are combined into a single block reflector
+        # I - VTV^T that is applied to the remaining columns with matrix
+        # products.
+        panel_size = 32
+        W = np.array(A,dtype='float64')
+        V = np.zeros((m,n))
+        T_blocks = []
+        for j in range(0,n,panel_size):
+            p = min(panel_size,n-j)
+            T = np.zeros((p,p))
+            for k in range(j,j+p):
+                # Reflection that maps W[k:,k] onto a multiple of the first axis
+                v = W[k:,k].copy()
+                alpha = Magnitude(v)
+                if (v[0] > 0):
+                    alpha = -alpha
+                v[0] -= alpha
+                v_magnitude = Magnitude(v)
+                if (v_magnitude != 0):
+                    v /= v_magnitude
+                    T[k-j,k-j] = 2
+                    W[k:,k:j+p] -= 2*np.outer(v,v@W[k:,k:j+p])
+                V[k:,k] = v
+                T[:k-j,k-j] = -T[k-j,k-j]*T[:k-j,:k-j]@(V[j:,j:k].transpose()@V[j:,k])
+            V_panel = V[j:,j:j+p]
+            
+            def UpdateTile(start, stop):
+                W[j:,start:stop] -= V_panel@(T.transpose()@(V_panel.transpose()@W[j:,start:stop]))
+            
+            RunTiles(UpdateTile,ColumnTiles(j+p,n,workers),workers)
+            T_blocks.append(T)
+        R = np.triu(W[:n,:])
+        
+        # Apply the block reflectors in reverse order to the first n columns 
+        # of the identity
+        Q = np.zeros((m,n))
+        Q[:n,:] = np.eye(n)
+        for j in range(((n-1)//panel_size)*panel_size,-1,-panel_size):
+            p = min(panel_size,n-j)
+            V_panel = V[j:,j:j+p]
+            T = T_blocks[j//panel_size]
+            
+            def UpdateTile(start, stop):
+                Q[j:,start:stop] -= V_panel@(T@(V_panel.transpose()@Q[j:,start:stop]))
+            
+            RunTiles(UpdateTile,ColumnTiles(j,n,workers),workers)
+        
+        # Choose signs so that R has a nonnegative diagonal like Gram-Schmidt
+        signs = np.where(np.diag(R) < 0,-1.,1.)
+        Q *= signs
+        R *= signs.reshape((n,1))
+        
+    elif (method == 'tsqr'):
+        if (block_size is None):
+            block_size = max(4*n,4096,math.isqrt(m*n))
+        block_size = max(block_size,n)
+        
+        # Row blocks, with a short final block merged into the one before it
+        starts = list(range(0,m,block_size))
+        if (len(starts) > 1 and m - starts[-1] < n):
+            starts.pop()
+        stops = starts[1:] + [m]
+        
+        if (Q_out is None):
+            Q = np.zeros((m,n))
+        else:
+            Q = Q_out
+        R_stack = np.zeros((n*len(starts),n))
+        
+        # The blocks are independent, so each one is factored on its own 
+        # thread with a single worker
+        def FactorBlock(b):
+            Q_block, R_stack[b*n:(b+1)*n,:] = QRFactorization.__wrapped__(
+                A[starts[b]:stops[b],:],method='householder',workers=1)
+            Q[starts[b]:stops[b],:] = Q_block
+        
+        def UpdateBlock(b):
+            Q[starts[b]:stops[b],:] = Q[starts[b]:stops[b],:]@Q_stack[b*n:(b+1)*n,:]
+        
+        blocks = [(b,) for b in range(len(starts))]
+        RunTiles(FactorBlock,blocks,workers)
         
-    R = Q.transpose()@A
+        # Factor the stacked R blocks and update each block of Q
+        Q_stack, R = QRFactorization.__wrapped__(R_stack,method='householder',workers=workers)
+        RunTiles(UpdateBlock,blocks,workers)
+        
+    else:
+        print("Method",method,"is not recognized.")
+        return
     
     return (Q,R)
 
+def QRIteration(A, tol = 1e-10, max_iter = 1000, method = 'householder'):
+    '''
+    QRIteration(A, tol = 1e-10, max_iter = 1000, method = 'householder')
+    
+    QRIteration approximates all eigenvalues of the nxn array A.  At each 
+    step the current array is factored as QR with QRFactorization, using 
+    the given method, and replaced by RQ, which has the same eigenvalues.
+    If the eigenvalues of A are real with distinct absolute values, the 
+    entries below the diagonal tend to zero, and iteration stops when they
+    are all less than tol.  The product V of all the Q factors is also 
+    returned.  If A is symmetric, the columns of V are eigenvectors.
+
+    Parameters
+    ----------
+    A : NumPy array object of dimension nxn
+    tol: optional float
+    max_iter: optional int
+    method: optional string
+
+    Returns
+    -------
+    eigenvalues: NumPy array object of dimension n
+    V: NumPy array object of dimension nxn
+    '''
+    # Check shape of A
+    if (A.shape[0] != A.shape[1]):
+        print("QRIteration accepts only square arrays.")
+        return None
+    n = A.shape[0]
+    
+    B = np.array(A,dtype='float64')
+    V = np.eye(n)
+    
+    for k in range(max_iter):
+        if (np.all(np.abs(np.tril(B,-1)) < tol)):
+            break
+        Q, R = QRFactorization.__wrapped__(B,method)
+        B = R@Q
+        V = V@Q
+    
+    return np.diag(B).copy(), V
+
+def RenderGraph(pos, edge_list, size = 1000, subgraph = None):
+    '''
+    RenderGraph(pos, edge_list, size = 1000, subgraph = None)
+    
+    RenderGraph draws the directed graph with the given node coordinates 
+    and edges directly into an RGB image of size x size pixels, which can
+    be shown with plt.imshow or written with plt.imsave.  Edges are drawn
+    as gray lines and nodes as blue squares, with no labels or arrows.  If
+    subgraph is given, its nodes and the edges connecting them are drawn in
+    red, as in HighlightSubgraph.  All edges are drawn at once by computing
+    the pixels along them with NumPy, so there is no matplotlib artist for
+    each node and edge.
+
+    Parameters
+    ----------
+    pos : dictionary of node coordinates
+    edge_list : list of (int,int) tuples
+    size: optional int
+    subgraph: optional list of ints
+
+    Returns
+    -------
+    image: NumPy array object of dimension size x size x 3 with dtype uint8
+    '''
+    image = np.full((size,size,3),255,dtype=np.uint8)
+    if (len(pos) == 0):
+        return image
+    
+    # Pixel coordinates of the nodes, with a margin around the edge.  Large
+    # layouts often have a few nodes far from the rest, so the scale is set
+    # by the middle 98% of the coordinates and the others are kept at the 
+    # margin.
+    nodes = list(pos)
+    index = {node: i for i, node in enumerate(nodes)}
+    XY = np.array([pos[node] for node in nodes],dtype='float64')
+    if (len(nodes) < 1000):
+        low, high = XY.min(axis=0), XY.max(axis=0)
+    else:
+        low, high = np.percentile(XY,1,axis=0), np.percentile(XY,99,axis=0)
+    extent = np.where(high > low,high - low,1.)
+    margin = size//50 + 2
+    XY = np.clip((XY - low)/extent,0,1)
+    P = np.rint(margin + XY*(size - 1 - 2*margin)).astype(np.int64)
+    highlighted = np.zeros(len(nodes),dtype=bool)
+    if (subgraph is not None):
+        highlighted[[index[node] for node in set(subgraph) if node in index]] = True
+    
+    # Each edge is sampled at about one point per pixel of its length
+    edges = [(index[i],index[j]) for i, j in edge_list 
+             if i in index and j in index]
+    if (len(edges) > 0):
+        edges = np.array(edges,dtype=np.int64)
+        start = P[edges[:,0]]
+        step = P[edges[:,1]] - start
+        counts = np.max(np.abs(step),axis=1) + 1
+        edge = np.repeat(np.arange(len(edges)),counts)
+        t = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,counts)
+        t = t/np.maximum(counts - 1,1)[edge]
+        points = np.rint(start[edge] + t.reshape((-1,1))*step[edge]).astype(np.int64)
+        image[size - 1 - points[:,1],points[:,0]] = (160,160,160)
+        inside = np.all(highlighted[edges],axis=1)[edge]
+        image[size - 1 - points[inside,1],points[inside,0]] = (214,39,40)
+    
+    # Nodes are squares of width 2*radius+1 drawn over the edges
+    radius = max(1,size//500)
+    offsets = np.arange(-radius,radius+1)
+    X = (P[:,0].reshape((-1,1,1)) + offsets.reshape((1,-1,1))).clip(0,size-1)
+    Y = (P[:,1].reshape((-1,1,1)) + offsets.reshape((1,1,-1))).clip(0,size-1)
+    X, Y = np.broadcast_arrays(X,Y)
+    image[size - 1 - Y,X] = (31,119,180)
+    image[size - 1 - Y[highlighted],X[highlighted]] = (214,39,40)
+    
+    return image
+
 def RowSwap(A,k,l):
     ''' 
     RowSwap(A,k,l)
@@ -437,15 +3266,15 @@ def RowSwap(A,k,l):
     B: NumPy array object of dimension mxn
     '''
 
-    m = A.shape[0]  # m is number of rows in A
-    n = A.shape[1]  # n is number of columns in A
-    
-    B = np.copy(A).astype('float64')
-
-    for j in range(n):
-        temp = B[k][j]
-        B[k][j] = B[l][j]
-        B[l][j] = temp
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    B = np.array(A,dtype='float64')
+    if (profile is not None):
+        mark = profile.Record('copy',mark,copied=B.nbytes)
+    B[[k,l]] = B[[l,k]]
+    if (profile is not None):
+        profile.Record('row swap',mark,row_operations=1,copied=2*B[k].nbytes)
         
     return B
 
@@ -468,13 +3297,15 @@ def RowScale(A,k,scale):
     B: NumPy array object of dimension mxn
     '''
     
-    m = A.shape[0]  # m is number of rows in A
-    n = A.shape[1]  # n is number of columns in A
-    
-    B = np.copy(A).astype('float64')
-
-    for j in range(n):
-        B[k][j] *= scale
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    B = np.array(A,dtype='float64')
+    if (profile is not None):
+        mark = profile.Record('copy',mark,copied=B.nbytes)
+    B[k] *= scale
+    if (profile is not None):
+        profile.Record('row scale',mark,row_operations=1,flops=B.shape[1])
         
     return B
 
@@ -498,75 +3329,115 @@ def RowAdd(A,k,l,scale):
     B: NumPy array object of dimension mxn
     '''
 
-    m = A.shape[0]  # m is number of rows in A
-    n = A.shape[1]  # n is number of columns in A
-    
-    B = np.copy(A).astype('float64')
-        
-    for j in range(n):
-        B[l][j] += B[k][j]*scale
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    B = np.array(A,dtype='float64')
+    if (profile is not None):
+        mark = profile.Record('copy',mark,copied=B.nbytes)
+    B[l] += B[k]*scale
+    if (profile is not None):
+        profile.Record('elimination',mark,row_operations=1,flops=2*B.shape[1],
+                       copied=B[k].nbytes)
         
     return B
 
-def RowReduction(A):
+def RowReduction(A, pivoting = False, backend = None, workers = None, 
+                 out = None, dtype = None):
     ''' 
-    RowReduction(A)
+    RowReduction(A, pivoting = False, backend = None, workers = None, 
+                 out = None, dtype = None)
     
     RowReduction performs steps of elimination with no pivot strategy to
     produce a row echelon from of the matrix A.  It is assumed that A
     is the augemented matrix associated with a linear system that has
     a unique solution.  RowReduction may not return correct results if A
     does not have dimensions n x (n+1) or does not have a pivot in each '
-    column.
+    column.  If pivoting is True, partial pivoting is used to choose the 
+    pivot in each column.  The steps of elimination are carried out by 
+    Elimination on a single working copy of A, with the given backend.  If
+    more than one worker is used, BlockedElimination is used instead, with 
+    the updates split among that many threads.  If A is a SciPy sparse 
+    matrix, SparseRowReduction is used and the result is sparse.
+    
+    The type of the entries of the working copy is chosen by the dtype 
+    policy, as described in WorkingDtype.  If out is given, the working 
+    copy is made in out instead, with the type of its entries.  If out is 
+    an np.memmap array stored on disk, BlockedElimination is used so that 
+    only part of it is loaded at a time.  If out is A, no copy is made and 
+    A is reduced in place.
     
     Parameters
     ----------
     A : NumPy array object of dimension mxn
+    pivoting: optional bool
+    backend: optional string, 'numpy' or 'numba'
+    workers: optional int, number of threads
+    out: optional NumPy array object of dimension mxn
+    dtype: optional string, dtype policy
     
     Returns
     -------
     B: NumPy array object of dimension mxn
     '''
     
-    m = A.shape[0]  # A has m rows 
-    n = A.shape[1]  # It is assumed that A has m+1 columns
+    if (IsSparse(A)):
+        return SparseRowReduction(A,pivoting)
     
-    B = np.copy(A).astype('float64')
-
-    # For each step of elimination, we find a suitable pivot, move it into
-    # position and create zeros for all entries below.
-    
-    for k in range(m):
-        # Set pivot as (k,k) entry
-        pivot = B[k][k]
-        pivot_row = k
-        
-        # Find a suitable pivot if the (k,k) entry is zero
-        while(pivot == 0 and pivot_row < m-1):
-            pivot_row += 1
-            pivot = B[pivot_row][k]
-            
-        # Swap row if needed
-        if (pivot_row != k):
-            B = RowSwap(B,k,pivot_row)
-            
-        # If pivot is nonzero, carry on with elimination in column k
-        if (pivot != 0):
-            B = RowScale(B,k,1./B[k][k])
-            for i in range(k+1,m):    
-                B = RowAdd(B,k,i,-B[i][k])
-        else:
-            print("Pivot could not be found in column",k,".")
+    profile = active_profile
+    if (profile is not None):
+        mark = time.perf_counter()
+    if (out is None):
+        B = WorkingCopy(A,WorkingDtype(A.dtype,dtype))
+    else:
+        B = out
+        if (out is not A):
+            CopyRows(A,out)
+    if (profile is not None and B is not A):
+        profile.Record('copy',mark,copied=B.nbytes)
+    
+    if (ActiveWorkers(workers) > 1 or isinstance(B,np.memmap)):
+        BlockedElimination(B,pivoting=pivoting,workers=workers,backend=backend)
+    else:
+        Elimination(B,pivoting=pivoting,backend=backend)
             
     return B
 
+def RunTiles(function, tiles, workers = None):
+    '''
+    RunTiles(function, tiles, workers = None)
+    
+    RunTiles calls function(*tile) for each tuple in tiles, on a pool of 
+    threads if more than one worker is used.  The calls must be independent
+    of each other.  Threads are used rather than processes because NumPy 
+    releases the GIL during matrix products and other operations on large 
+    arrays, so the tiles can share the arrays without copies.
+
+    Parameters
+    ----------
+    function: function
+    tiles: list of tuples of arguments
+    workers: optional int, number of threads
+
+    Returns
+    -------
+    results: list of the values returned by function
+    '''
+    count = ActiveWorkers(workers)
+    if (count == 1 or len(tiles) < 2):
+        return [function(*tile) for tile in tiles]
+    
+    if (count not in thread_pools):
+        thread_pools[count] = ThreadPoolExecutor(max_workers=count)
+    return list(thread_pools[count].map(lambda tile: function(*tile),tiles))
 
 def ScaleMatrixRows(A):
     ''' 
     ScaleMatrixRows(A)
     
     ScaleMatrix rows accepts an mxn array where each row has been scaled
-    to unit length.
+    to unit length.  The magnitudes of all rows are computed in a single 
+    call to Magnitude.  Rows of zeros are left unchanged.
     
     Parameters
     ----------
@@ -577,58 +3448,404 @@ def ScaleMatrixRows(A):
     B: NumPy array object of dimension mxn
     '''    
     
-    m = A.shape[0]
-    n = A.shape[1]
+    B = np.array(A,dtype='float64')
     
-    B = np.copy(A).astype('float64')
-
-    for i in range(m):
-        row = A[i:i+1,:]
-        row_magnitude = Magnitude(row.transpose())
-        if (row_magnitude != 0):
-            for j in range(n):
-                B[i,j] = B[i,j]/row_magnitude
+    # The rows of B are the columns of its transpose
+    row_magnitudes = np.atleast_1d(Magnitude(B.transpose())).reshape((-1,1))
+    np.divide(B,row_magnitudes,out=B,where=(row_magnitudes != 0))
     
     return B
 
-def SolveSystem(A,B):
+def SetBackend(name):
+    '''
+    SetBackend(name)
+    
+    SetBackend chooses the backend used by default for the loops in 
+    Elimination, BackSubstitution and ForwardSubstitution.  'numpy' uses 
+    NumPy operations on slices, and 'numba' uses loops compiled with Numba.
+    If Numba is not installed, 'numpy' is used in its place.
+
+    Parameters
+    ----------
+    name: string, 'numpy' or 'numba'
+
+    Returns
+    -------
+    None
+    '''
+    global backend
+    
+    if (name not in ('numpy','numba')):
+        print("Backend",name,"is not recognized.")
+        return
+    if (name == 'numba' and numba is None):
+        print("Numba is not installed.  The numpy backend will be used.")
+    backend = name
+
+def SetDtypePolicy(name):
+    '''
+    SetDtypePolicy(name)
+    
+    SetDtypePolicy chooses the dtype policy used by default for the working
+    copies made by RowReduction, FullRowReduction, the substitutions, 
+    LUFactorization, Inverse and SolveSystem.  The policies are described 
+    in WorkingDtype.
+
+    Parameters
+    ----------
+    name: string, 'float64', 'preserve', 'mixed' or 'exact'
+
+    Returns
+    -------
+    None
+    '''
+    global dtype_policy
+    
+    if (name not in ('float64','preserve','mixed','exact')):
+        print("Dtype policy",name,"is not recognized.")
+        return
+    dtype_policy = name
+
+def SetWorkers(count):
+    '''
+    SetWorkers(count)
+    
+    SetWorkers chooses the number of threads used by default for the tiled
+    updates in RowReduction, LUFactorization and QRFactorization.  With one
+    worker, the original unblocked steps are used.
+
+    Parameters
+    ----------
+    count: int
+
+    Returns
+    -------
+    None
+    '''
+    global workers
+    
+    if (int(count) < 1):
+        print("The number of workers must be at least 1.")
+        return
+    workers = int(count)
+
+def SolveSystem(A, B, ordering = 'colamd', method = 'direct', 
+                workspace = None, dtype = None, tol = 1e-10):
     ''' 
-    SolveSystem(A,B)
+    SolveSystem(A, B, ordering = 'colamd', method = 'direct', 
+                workspace = None, dtype = None, tol = 1e-10)
     BSV:  Accepts both (n,1) and (n,) for B.  Returns shape (n,1)
     
     SystemSolve computes the solution to AX=B by elimination in the case that
     A is a square nxn matrix
     
+    If A is a SciPy sparse matrix, the system is solved with a sparse LU 
+    factorization that skips zero entries.  The columns are first reordered
+    to reduce fill-in, using one of the orderings 'colamd', 'mmd_ata', 
+    'mmd_at_plus_a' or 'natural' (no reordering).  The ordering has no 
+    effect for NumPy arrays.
+    
+    Instead of elimination ('direct'), method can be one of the iterative
+    solvers 'jacobi', 'gauss-seidel', 'cg' or 'gmres', with their default
+    settings, or 'auto' to let ChooseSolver decide.  Only 'cg' and 'gmres'
+    accept a function that returns AX in place of A.  With any other 
+    method a message is printed and None is returned.  If the relative 
+    residual |B-AX|/|B| has not reached tol when the iterative method stops,
+    a message is printed and None is returned.
+    
+    For a NumPy array A, workspace can be an nx(n+1) array, for example an
+    np.memmap array stored on disk, to hold the augmented matrix in place of
+    a new array.  For an np.memmap the elimination is carried out in panels,
+    so A can be larger than the available memory.
+    
+    The type of the entries used in the elimination is chosen by the dtype
+    policy, as described in WorkingDtype.  With 'mixed', A is factored with
+    LUFactorization in float32 and the solution is refined in float64.
+    
     Parameters
     ----------
     A : NumPy array object of dimension nxn
     B : NumPy array object of dimension nx1
+    ordering: optional string
+    method: optional string
+    workspace: optional NumPy array object of dimension nx(n+1)
+    dtype: optional string, dtype policy
+    tol: optional float, for iterative methods
     
     Returns
     -------
     X: NumPy array object of dimension nx1
     '''
+    if (method == 'auto'):
+        method = ChooseSolver(A)
+    
+    if (callable(A) and method in ('direct','jacobi','gauss-seidel')):
+        print("Method",method,"is not supported when A is a function.")
+        return None
+    
+    if (method != 'direct'):
+        solvers = {'jacobi': Jacobi, 'gauss-seidel': GaussSeidel, 
+                   'cg': ConjugateGradient, 'gmres': GMRES}
+        if (method not in solvers):
+            print("Method",method,"is not recognized.")
+            return None
+        result = solvers[method](A,B,tol=tol)
+        if (result is None):
+            return None
+        X, residuals = result
+        if (not residuals[-1] < tol):
+            print("Method",method,"did not converge.  Relative residual is",
+                  residuals[-1],".")
+            return None
+        return X
+    
     # Check shape of A
     if (A.shape[0] != A.shape[1]):
         print("SolveSystem accepts only square arrays.")
         return None
     n = A.shape[0]  # n is number of rows and columns in A
+    
+    if (IsSparse(A)):
+        if (IsSparse(B)):
+            B = B.toarray()
+        B = np.asarray(B,dtype='float64').reshape((n,-1))
+        LU = sparse_linalg.splu(sparse.csc_matrix(A,dtype='float64'),
+                                permc_spec=ordering.upper())
+        return LU.solve(B)
+    
     B.shape = (n,1)
     
-    # Join A and B to make the augmented matrix
-    A_augmented = np.hstack((A,B))
+    if (ActiveDtypePolicy(dtype) == 'mixed'):
+        return LUFactorization(A,dtype='mixed').Solve(B)
+    
+    # Join A and B to make the augmented matrix, with the type of entries 
+    # chosen for A
+    if (workspace is None):
+        A_augmented = WorkingCopy(np.hstack((A,B)),WorkingDtype(A.dtype,dtype))
+    else:
+        A_augmented = workspace
+        CopyRows(A,A_augmented[:,0:n])
+        A_augmented[:,n:n+1] = B
     
-    # Carry out elimination    
-    R = RowReduction(A_augmented)
+    # Carry out elimination on A_augmented in place
+    R = RowReduction(A_augmented,out=A_augmented)
 
     # Split R back into nxn piece and nx1 piece
     B_reduced = R[:,n:n+1]
     A_reduced = R[:,0:n]
 
     # Do back substitution
-    X = BackSubstitution(A_reduced,B_reduced)
+    X = BackSubstitution(A_reduced,B_reduced,dtype=dtype)
     
     return X
 
+def SparseRowReduction(A, pivoting = False):
+    '''
+    SparseRowReduction(A, pivoting = False)
+    
+    SparseRowReduction carries out the same steps of elimination as 
+    RowReduction on the SciPy sparse matrix A.  Each row is stored as a 
+    dictionary of its nonzero entries, and a row operation only visits the
+    entries that are present, so the zeros of A are never examined.  New
+    nonzero entries (fill-in) are only created where elimination requires
+    them.  If pivoting is True, partial pivoting is used.
+
+    Parameters
+    ----------
+    A : SciPy sparse matrix of dimension mxn
+    pivoting: optional bool
+
+    Returns
+    -------
+    B: SciPy sparse matrix of dimension mxn in CSR format
+    '''
+    
+    A = sparse.csr_matrix(A,dtype='float64')
+    m = A.shape[0]  # m is number of rows in A
+    n = A.shape[1]  # n is number of columns in A
+    
+    rows = []
+    for i in range(m):
+        entries = slice(A.indptr[i],A.indptr[i+1])
+        rows.append(dict(zip(A.indices[entries].tolist(),A.data[entries].tolist())))
+    
+    # For each column, the set of rows that have an entry in that column
+    column_rows = [set() for j in range(n)]
+    for i in range(m):
+        for j in rows[i]:
+            column_rows[j].add(i)
+    
+    for k in range(min(m,n)):
+        candidates = [i for i in column_rows[k] if i >= k and rows[i][k] != 0]
+        if (len(candidates) == 0):
+            print("Pivot could not be found in column",k,".")
+            continue
+        
+        if (pivoting):
+            pivot_row = max(candidates,key=lambda i: abs(rows[i][k]))
+        else:
+            pivot_row = min(candidates)
+        
+        # Swap row if needed
+        if (pivot_row != k):
+            for j in rows[k]:
+                column_rows[j].discard(k)
+            for j in rows[pivot_row]:
+                column_rows[j].discard(pivot_row)
+            rows[k], rows[pivot_row] = rows[pivot_row], rows[k]
+            for j in rows[k]:
+                column_rows[j].add(k)
+            for j in rows[pivot_row]:
+                column_rows[j].add(pivot_row)
+        
+        # Set pivot entry to one
+        scale = 1./rows[k][k]
+        pivot_entries = rows[k]
+        for j in pivot_entries:
+            pivot_entries[j] *= scale
+        
+        # Create zeros below pivot, visiting only rows with an entry in column k
+        for i in [i for i in column_rows[k] if i > k]:
+            multiplier = rows[i].pop(k)
+            column_rows[k].discard(i)
+            for j, value in pivot_entries.items():
+                if (j == k):
+                    continue
+                if (j in rows[i]):
+                    rows[i][j] -= multiplier*value
+                else:
+                    rows[i][j] = -multiplier*value
+                    column_rows[j].add(i)
+    
+    # Assemble the rows into CSR format
+    indptr = np.zeros(m+1,dtype=int)
+    for i in range(m):
+        indptr[i+1] = indptr[i] + len(rows[i])
+    indices = np.fromiter((j for row in rows for j in row),dtype=int,count=indptr[m])
+    data = np.fromiter((v for row in rows for v in row.values()),dtype='float64',
+                       count=indptr[m])
+    B = sparse.csr_matrix((data,indices,indptr),shape=(m,n))
+    B.sort_indices()
+    B.eliminate_zeros()
+    
+    return B
+
+@Compiled
+def SubstitutionKernel(T, X, lower, unit_diagonal):
+    '''
+    SubstitutionKernel(T, X, lower, unit_diagonal)
+    
+    Loop version of BackSubstitution (lower False) and ForwardSubstitution
+    (lower True) for the 'numba' backend.  X holds the right hand sides and
+    is replaced by the solution.
+
+    Returns
+    -------
+    singular: NumPy array object of ints, the zero pivot positions
+    '''
+    m = T.shape[0]
+    k = X.shape[1]
+    
+    singular = np.zeros(m,dtype=np.int64)
+    count = 0
+    
+    for step in range(m):
+        if (lower):
+            i = step
+            start = 0
+            stop = i
+        else:
+            i = m-1-step
+            start = i+1
+            stop = m
+        for c in range(k):
+            total = X[i,c]
+            for j in range(start,stop):
+                total -= T[i,j]*X[j,c]
+            X[i,c] = total
+        if (unit_diagonal):
+            continue
+        if (T[i,i] != 0):
+            for c in range(k):
+                X[i,c] /= T[i,i]
+        else:
+            singular[count] = i
+            count += 1
+    
+    return singular[:count]
+
+def WorkingCopy(A, dtype):
+    '''
+    WorkingCopy(A, dtype)
+    
+    WorkingCopy returns a copy of A with entries of type dtype, usually the
+    type chosen by WorkingDtype.  For dtype object, every entry is converted
+    to a Fraction, so that elimination on the copy is exact.  Floats are 
+    converted exactly, as in Fraction(0.1).
+
+    Parameters
+    ----------
+    A : NumPy array object
+    dtype: NumPy dtype
+
+    Returns
+    -------
+    B: NumPy array object with the shape of A
+    '''
+    if (dtype != object):
+        return np.array(A,dtype=dtype)
+    
+    B = np.empty(np.shape(A),dtype=object)
+    for index, entry in np.ndenumerate(A):
+        if (isinstance(entry,(Fraction,int,np.integer))):
+            B[index] = Fraction(entry)
+        else:
+            B[index] = Fraction(float(entry))
+    return B
+
+def WorkingDtype(dtype, policy = None):
+    '''
+    WorkingDtype(dtype, policy = None)
+    
+    WorkingDtype returns the type of the entries used in the working copy 
+    of an array with entries of type dtype, under the given dtype policy.  
+    If policy is None, the module setting is used.
+    
+    'float64': Entries are converted to float64.  This is the default.
+    'preserve': float32 and other floating types are kept, so no memory is
+        spent on a float64 copy.  Integers are converted to float64, and 
+        object arrays (for example of Fractions) are kept.
+    'mixed': Entries are converted to float32.  SolveSystem, Inverse and 
+        LUFactors.Solve then refine the solution in float64.
+    'exact': Entries are converted to Fractions (dtype object), so that 
+        elimination has no roundoff.  This is only practical for small 
+        arrays.
+    
+    The policy applies to the elimination and substitution routines, 
+    LUFactorization, Inverse and SolveSystem.  Routines that use them 
+    internally, such as DeterminantIteration, GMRES, InverseIteration, 
+    LeastSquares and IncrementalLeastSquares, always work in float64.
 
+    Parameters
+    ----------
+    dtype: NumPy dtype
+    policy: optional string
 
+    Returns
+    -------
+    dtype: NumPy dtype
+    '''
+    policy = ActiveDtypePolicy(policy)
+    dtype = np.dtype(dtype)
+    
+    if (policy == 'preserve'):
+        if (dtype.kind in 'fcO'):
+            return dtype
+        return np.dtype('float64')
+    if (policy == 'mixed'):
+        return np.dtype('float32')
+    if (policy == 'exact'):
+        return np.dtype(object)
+    if (policy != 'float64'):
+        print("Dtype policy",policy,"is not recognized.")
+    return np.dtype('float64')
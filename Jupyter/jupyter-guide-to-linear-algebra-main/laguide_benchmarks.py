@@ -0,0 +1,543 @@
+# -*- coding: utf-8 -*-
+"""
+Timing comparisons for the routines in laguide.
+
+Run as a script to print the results:
+
+    python laguide_benchmarks.py
+
+or to run the benchmark suite and check for regressions against the 
+baseline stored in the history file:
+
+    python laguide_benchmarks.py --suite [--quick] [--history FILE]
+                                 [--threshold 1.25] [--baseline]
+
+or to check that the 'numpy' and 'numba' backends agree, exiting with 
+status 1 if they do not:
+
+    python laguide_benchmarks.py --check-backends
+
+The Legacy functions below reproduce the original row operations, where
+every RowSwap, RowScale and RowAdd makes a full copy of the array and loops
+over the columns in Python.  They are kept only as a point of reference.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import laguide as lag
+
+def LegacyRowOperation(B,k,l,scale):
+    '''
+    LegacyRowOperation(B,k,l,scale)
+
+    Copy of B with row k multiplied by scale and added to row l, using the
+    original copy-and-loop approach.  If l is None, row k is scaled instead.
+    '''
+    B = np.copy(B).astype('float64')
+    for j in range(B.shape[1]):
+        if (l is None):
+            B[k][j] *= scale
+        else:
+            B[l][j] += B[k][j]*scale
+    return B
+
+def LegacyRowReduction(A):
+    '''
+    LegacyRowReduction(A)
+
+    RowReduction as originally written in laguide, with a copy of the array
+    made for every row operation.
+    '''
+    m = A.shape[0]
+    B = np.copy(A).astype('float64')
+    for k in range(m):
+        pivot = B[k][k]
+        pivot_row = k
+        while(pivot == 0 and pivot_row < m-1):
+            pivot_row += 1
+            pivot = B[pivot_row][k]
+        if (pivot_row != k):
+            B = np.copy(B).astype('float64')
+            B[[k,pivot_row]] = B[[pivot_row,k]]
+        if (pivot != 0):
+            B = LegacyRowOperation(B,k,None,1./B[k][k])
+            for i in range(k+1,m):
+                B = LegacyRowOperation(B,k,i,-B[i][k])
+    return B
+
+def TimeCall(function, *args, repeat = 1):
+    '''
+    TimeCall(function, *args, repeat = 1)
+
+    Returns the best wall time in seconds over repeat calls of function.
+    '''
+    best = float('inf')
+    for r in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def BenchmarkRowReduction(sizes = (50,200,1000), legacy_max = 200):
+    '''
+    BenchmarkRowReduction(sizes = (50,200,1000), legacy_max = 200)
+
+    Times RowReduction and FullRowReduction on random n x (n+1) augmented
+    matrices, along with the legacy RowReduction for n <= legacy_max.  The
+    legacy code needs O(n^2) full copies of the array, so n = 1000 is only
+    practical to run with a larger legacy_max and a lot of patience.
+    '''
+    rng = np.random.default_rng(0)
+    print("RowReduction on n x (n+1) augmented matrices (seconds)")
+    print("%6s %12s %12s %12s %12s" % ("n","legacy","RowRed.","pivoting","FullRowRed."))
+    for n in sizes:
+        A = rng.standard_normal((n,n+1))
+        if (n <= legacy_max):
+            legacy = "%12.4f" % TimeCall(LegacyRowReduction,A)
+        else:
+            legacy = "%12s" % "-"
+        current = TimeCall(lag.RowReduction,A,repeat=3)
+        pivoting = TimeCall(lambda A: lag.RowReduction(A,pivoting=True),A,repeat=3)
+        full = TimeCall(lag.FullRowReduction,A,repeat=3)
+        print("%6d %s %12.4f %12.4f %12.4f" % (n,legacy,current,pivoting,full))
+
+def BenchmarkLUSolves(sizes = (50,200,500), count = 100):
+    '''
+    BenchmarkLUSolves(sizes = (50,200,500), count = 100)
+
+    Compares throughput in solves per second for count right hand sides
+    against the same nxn matrix: SolveSystem in a loop, LUFactors.Solve in a
+    loop, and a single LUFactors.Solve with all right hand sides as an nxk
+    array.  The factorization time is included for the LU columns.
+    '''
+    rng = np.random.default_rng(0)
+    print("Solves per second with count right hand sides")
+    print("%6s %14s %14s %14s" % ("n","SolveSystem","LU loop","LU batch"))
+    for n in sizes:
+        A = rng.standard_normal((n,n))
+        B = rng.standard_normal((n,count))
+        
+        def SolveLoop():
+            for j in range(count):
+                lag.SolveSystem(A,B[:,j].copy())
+        
+        def LULoop():
+            LU = lag.LUFactorization(A)
+            for j in range(count):
+                LU.Solve(B[:,j])
+        
+        def LUBatch():
+            lag.LUFactorization(A).Solve(B)
+        
+        print("%6d %14.0f %14.0f %14.0f" % (n,count/TimeCall(SolveLoop),
+                                            count/TimeCall(LULoop),
+                                            count/TimeCall(LUBatch,repeat=3)))
+
+def BenchmarkBatchSolve(sizes = (3,4,8), batch = 1000000, loop_count = 2000):
+    '''
+    BenchmarkBatchSolve(sizes = (3,4,8), batch = 1000000, loop_count = 2000)
+
+    Compares throughput in systems per second for a stack of batch small 
+    nxn systems: BatchSolveSystem on the whole stack against SolveSystem 
+    called once per system on the first loop_count systems.
+    '''
+    rng = np.random.default_rng(0)
+    print("Small systems solved per second")
+    print("%6s %14s %14s" % ("n","SolveSystem","BatchSolve"))
+    for n in sizes:
+        A = rng.standard_normal((batch,n,n))
+        B = rng.standard_normal((batch,n))
+        
+        def SolveLoop():
+            for i in range(loop_count):
+                lag.SolveSystem(A[i],B[i].copy())
+        
+        print("%6d %14.0f %14.0f" % (n,loop_count/TimeCall(SolveLoop),
+                                     batch/TimeCall(lag.BatchSolveSystem,A,B)))
+
+def BenchmarkHillCipher(sizes = (2,3,8), length = 10**7, legacy_length = 20000):
+    '''
+    BenchmarkHillCipher(sizes = (2,3,8), length = 10**7, 
+                        legacy_length = 20000)
+
+    Compares throughput in MB/s of Hill Cipher encryption with an nxn key: 
+    HillCipherEncryption on a message of legacy_length characters against 
+    the Encrypt method of a HillCipher on a message of length characters.
+    '''
+    import hillcipher
+    
+    rng = np.random.default_rng(0)
+    letters = np.frombuffer(''.join(hillcipher.alphabet).encode('ascii'),dtype=np.uint8)
+    text = letters[rng.integers(0,len(letters),length)].tobytes().decode('ascii')
+    print("Hill Cipher encryption in MB/s")
+    print("%6s %22s %14s" % ("n","HillCipherEncryption","HillCipher"))
+    for n in sizes:
+        A = rng.integers(0,len(letters),(n,n))
+        while (not hillcipher.CheckEncryptionMatrix(A)):
+            A = rng.integers(0,len(letters),(n,n))
+        cipher = hillcipher.HillCipher(A)
+        cipher.Encrypt(text)
+        seconds = TimeCall(hillcipher.HillCipherEncryption,text[:legacy_length],A)
+        print("%6d %22.2f %14.2f" % (n,legacy_length/seconds/1e6,cipher.Throughput()))
+
+def BenchmarkScaling(n = 3000, worker_counts = (1,2,4,8,16,32,64)):
+    '''
+    BenchmarkScaling(n = 3000, worker_counts = (1,2,4,8,16,32,64))
+
+    Strong scaling of the tiled factorizations: the same problem is solved 
+    with each number of workers, up to the number of CPUs.  The times are 
+    for BlockedElimination with partial pivoting on an nxn array and the 
+    'tsqr' QRFactorization of a (20n)x(n/10) array in 64 row blocks.  
+    Speedup is relative to one worker.  Set OMP_NUM_THREADS=1 before 
+    starting Python so that the BLAS library does not start threads of its
+    own.
+    '''
+    rng = np.random.default_rng(0)
+    A = rng.standard_normal((n,n))
+    C = rng.standard_normal((20*n,max(n//10,1)))
+    block_size = max(C.shape[0]//64,C.shape[1])
+    counts = [w for w in worker_counts if w <= (os.cpu_count() or 1)]
+    print("Strong scaling with n = %d on %d CPUs (seconds)" % (n,os.cpu_count() or 1))
+    print("%8s %10s %8s %10s %8s" % ("workers","LU","speedup","TSQR","speedup"))
+    base = None
+    for w in counts:
+        times = (TimeCall(lambda: lag.BlockedElimination(np.array(A),pivoting=True,workers=w)),
+                 TimeCall(lambda: lag.QRFactorization(C,'tsqr',block_size=block_size,workers=w)))
+        if (base is None):
+            base = times
+        print("%8d %10.4f %8.2f %10.4f %8.2f" % (w,times[0],base[0]/times[0],times[1],base[1]/times[1]))
+
+def SuiteCases(quick = False):
+    '''
+    SuiteCases(quick = False)
+
+    Returns the cases of the benchmark suite as a list of (name, function)
+    pairs, where function takes no arguments.  The cases cover the public 
+    functions of laguide over a sweep of sizes, dtypes and, when SciPy is
+    installed, sparse densities.  The names record the parameters, for 
+    example 'RowReduction/float32/n=200'.  With quick, smaller sizes are 
+    used.  The inputs are made here so they are not part of the timings.
+    
+    Some public names are left out.  SetBackend, SetDtypePolicy, 
+    SetWorkers, EnableCache, Profile and ClearLayouts change settings and 
+    do no work of their own.  DrawGraph and HighlightSubgraph spend their 
+    time in matplotlib.  Helpers such as EliminationKernel, WorkingCopy and
+    ChooseSolver are timed as part of the routines that call them.
+    '''
+    rng = np.random.default_rng(0)
+    if (quick):
+        sizes = (20,60)
+        small_sizes = (6,)
+    else:
+        sizes = (50,200,500)
+        small_sizes = (6,8)
+    cases = []
+    
+    def Add(name, function, *args, **kwargs):
+        cases.append((name,lambda: function(*args,**kwargs)))
+    
+    def Update(LU, u, v):
+        # Each call starts from the factors alone, so that the repeats take
+        # the same time
+        LU.updates.clear()
+        LU.Update(u,v)
+    
+    def Layout(G):
+        # The layouts kept by GraphLayout are cleared so it is not timing 
+        # a lookup
+        lag.ClearLayouts()
+        return lag.GraphLayout(G)
+    
+    for n in sizes:
+        A = rng.standard_normal((n,n)) + n*np.eye(n)
+        B = rng.standard_normal((n,1))
+        U = np.triu(A)
+        S = A + A.transpose()
+        for dtype in ('float64','float32'):
+            A_t = A.astype(dtype)
+            B_t = B.astype(dtype)
+            policy = {'float64': 'float64', 'float32': 'preserve'}[dtype]
+            tag = "%s/n=%d" % (dtype,n)
+            Add("RowReduction/"+tag,lag.RowReduction,np.hstack((A_t,B_t)),dtype=policy)
+            Add("FullRowReduction/"+tag,lag.FullRowReduction,A_t,dtype=policy)
+            Add("BackSubstitution/"+tag,lag.BackSubstitution,U.astype(dtype),B_t,dtype=policy)
+            Add("ForwardSubstitution/"+tag,lag.ForwardSubstitution,U.transpose().astype(dtype),B_t,dtype=policy)
+            Add("SolveSystem/"+tag,lag.SolveSystem,A_t,B_t.copy(),dtype=policy)
+            Add("Inverse/"+tag,lag.Inverse,A_t,dtype=policy)
+            Add("LUFactorization/"+tag,lag.LUFactorization,A_t,dtype=policy)
+        tag = "float64/n=%d" % n
+        Add("SolveSystem/mixed/n=%d" % n,lag.SolveSystem,A,B.copy(),dtype='mixed')
+        Add("DeterminantIteration/elimination/n=%d" % n,lag.DeterminantIteration,A,'elimination')
+        for method in ('classical','modified','householder','tsqr'):
+            Add("QRFactorization/%s/n=%d" % (method,n),lag.QRFactorization,
+                rng.standard_normal((4*n,n)),method)
+        Add("LeastSquares/"+tag,lag.LeastSquares,rng.standard_normal((4*n,n)),
+            rng.standard_normal((4*n,4)))
+        Add("IncrementalLeastSquares/"+tag,lag.IncrementalLeastSquares,
+            rng.standard_normal((4*n,n)),rng.standard_normal((4*n,4)))
+        Add("LUFactors.Update/"+tag,Update,lag.LUFactorization(A),
+            rng.standard_normal(n),rng.standard_normal(n))
+        Add("RowSwap/"+tag,lag.RowSwap,A,0,n-1)
+        Add("RowScale/"+tag,lag.RowScale,A,0,2.)
+        Add("RowAdd/"+tag,lag.RowAdd,A,0,n-1,2.)
+        Add("ScaleMatrixRows/"+tag,lag.ScaleMatrixRows,A)
+        Add("DotProduct/"+tag,lag.DotProduct,A,A)
+        Add("Magnitude/"+tag,lag.Magnitude,A)
+        Add("OrthogonalityError/"+tag,lag.OrthogonalityError,A)
+        Add("EdgeList/"+tag,lag.EdgeList,(A > n).astype(int))
+        Add("Jacobi/"+tag,lag.Jacobi,A,B)
+        Add("GaussSeidel/"+tag,lag.GaussSeidel,A,B)
+        Add("ConjugateGradient/"+tag,lag.ConjugateGradient,S,B)
+        Add("GMRES/"+tag,lag.GMRES,A,B)
+        Add("PowerIteration/"+tag,lag.PowerIteration,S)
+        Add("InverseIteration/"+tag,lag.InverseIteration,S)
+        Add("Arnoldi/"+tag,lag.Arnoldi,A,3)
+        Add("Lanczos/"+tag,lag.Lanczos,S,3)
+        if (n <= 200):
+            Add("QRIteration/"+tag,lag.QRIteration,S,max_iter=100)
+        Add("BatchSolveSystem/n=4/batch=%d" % (100*n),lag.BatchSolveSystem,
+            rng.standard_normal((100*n,4,4)),rng.standard_normal((100*n,4)))
+        Add("BatchInverse/n=4/batch=%d" % (100*n),lag.BatchInverse,
+            rng.standard_normal((100*n,4,4)))
+        Add("BatchDeterminant/n=4/batch=%d" % (100*n),lag.BatchDeterminant,
+            rng.standard_normal((100*n,4,4)))
+        G = (rng.random((n,n)) < 4/n).astype(int)
+        Add("GraphLayout/"+tag,Layout,G)
+        Add("RenderGraph/"+tag,lag.RenderGraph,lag.GraphLayout(G),lag.EdgeList(G))
+        if (lag.sparse is not None):
+            for density in (0.01,0.1):
+                A_s = lag.sparse.random(n,n,density=density,random_state=0,format='csr') \
+                      + n*lag.sparse.identity(n,format='csr')
+                tag = "sparse=%g/n=%d" % (density,n)
+                Add("RowReduction/"+tag,lag.RowReduction,lag.sparse.hstack((A_s,B)).tocsr())
+                Add("SolveSystem/"+tag,lag.SolveSystem,A_s,B.copy())
+                Add("DotProduct/"+tag,lag.DotProduct,A_s,A_s)
+                Add("EdgeList/"+tag,lag.EdgeList,A_s)
+    
+    for n in small_sizes:
+        A = rng.integers(-5,6,(n,n))
+        Add("DeterminantIteration/cofactor/n=%d" % n,lag.DeterminantIteration,A,'cofactor')
+    for n in sizes:
+        A = rng.integers(-5,6,(n,n))
+        Add("DeterminantIteration/exact/n=%d" % n,lag.DeterminantIteration,A,'exact')
+        if (n <= 60):
+            Add("SolveSystem/exact/n=%d" % n,lag.SolveSystem,A,np.ones((n,1)),dtype='exact')
+    
+    return cases
+
+def MeasureCase(function, repeat = 3):
+    '''
+    MeasureCase(function, repeat = 3)
+
+    Returns the best wall time in seconds over repeat calls of function, 
+    along with the peak memory in bytes and the number of memory blocks 
+    allocated and not yet freed during one more call traced by tracemalloc.
+    Anything printed by function is discarded.
+    '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds = TimeCall(function,repeat=repeat)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        function()
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    blocks = sum(max(stat.count_diff,0) for stat in after.compare_to(before,'filename'))
+    return {'seconds': seconds, 'peak_bytes': peak, 'blocks': blocks}
+
+def RunSuite(quick = False, repeat = 3):
+    '''
+    RunSuite(quick = False, repeat = 3)
+
+    Measures every case from SuiteCases with MeasureCase, with the result 
+    cache turned off, and returns a dictionary of the measurements by name.
+    '''
+    cache = lag.cache
+    lag.DisableCache()
+    try:
+        results = {}
+        for name, function in SuiteCases(quick):
+            results[name] = MeasureCase(function,repeat)
+    finally:
+        lag.cache = cache
+    return results
+
+def CompareResults(results, baseline, threshold = 1.25, min_seconds = 1e-3):
+    '''
+    CompareResults(results, baseline, threshold = 1.25, min_seconds = 1e-3)
+
+    Returns a list of (name, ratio) for the cases that are slower than in 
+    baseline by more than the factor threshold.  Cases that took less than
+    min_seconds in both runs are skipped, since their timings are mostly 
+    noise, as are cases that are not in both.
+    '''
+    regressions = []
+    for name in sorted(results):
+        if (name not in baseline):
+            continue
+        seconds = results[name]['seconds']
+        base = baseline[name]['seconds']
+        if (max(seconds,base) < min_seconds):
+            continue
+        ratio = seconds/max(base,1e-12)
+        if (ratio > threshold):
+            regressions.append((name,ratio))
+    return regressions
+
+def BenchmarkSuite(history = 'laguide_benchmarks.json', quick = False, 
+                   threshold = 1.25, update_baseline = False, repeat = 3):
+    '''
+    BenchmarkSuite(history = 'laguide_benchmarks.json', quick = False, 
+                   threshold = 1.25, update_baseline = False, repeat = 3)
+
+    Runs the suite, prints the measurements next to the baseline, and 
+    appends them to the JSON history file.  The file holds a 'baseline' of 
+    results and a list of earlier runs in 'runs'.  The first run becomes 
+    the baseline, and update_baseline replaces it with this run.  Quick 
+    and full runs have separate baselines.  Returns the list of regressions
+    found by CompareResults.
+    '''
+    results = RunSuite(quick,repeat)
+    
+    if (os.path.exists(history)):
+        with open(history) as file:
+            stored = json.load(file)
+    else:
+        stored = {'baseline': {}, 'runs': []}
+    mode = 'quick' if quick else 'full'
+    baseline = stored['baseline'].get(mode,{})
+    
+    print("%-48s %10s %10s %12s %8s" % ("case","seconds","baseline","peak bytes","blocks"))
+    for name in sorted(results):
+        result = results[name]
+        base = "%10.4f" % baseline[name]['seconds'] if name in baseline else "%10s" % "-"
+        print("%-48s %10.4f %s %12d %8d" % (name,result['seconds'],base,
+                                            result['peak_bytes'],result['blocks']))
+    
+    regressions = CompareResults(results,baseline,threshold)
+    for name, ratio in regressions:
+        print("Regression: %s is %.2f times slower than the baseline." % (name,ratio))
+    
+    stored['runs'].append({'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                           'mode': mode, 'results': results})
+    if (update_baseline or not baseline):
+        stored['baseline'][mode] = results
+    with open(history,'w') as file:
+        json.dump(stored,file,indent=1)
+    
+    return regressions
+
+def BenchmarkBackends(sizes = (200,1000)):
+    '''
+    BenchmarkBackends(sizes = (200,1000))
+
+    Times RowReduction, FullRowReduction and BackSubstitution with the 
+    'numpy' and 'numba' backends, after checking that both backends give
+    the same results.  Without Numba, both columns use the numpy backend.
+    '''
+    CheckBackends()
+    rng = np.random.default_rng(0)
+    print("Backend comparison (seconds)")
+    print("%6s %8s %12s %12s %12s" % ("n","backend","RowRed.","FullRowRed.","BackSub."))
+    for n in sizes:
+        A = rng.standard_normal((n,n+1))
+        U = np.triu(A[:,:n]) + n*np.eye(n)
+        for backend in ('numpy','numba'):
+            # Small call first so compilation time is not included
+            lag.FullRowReduction(A[:2,:3],backend=backend)
+            lag.BackSubstitution(U[:2,:2],A[:2,n],backend=backend)
+            times = (TimeCall(lambda: lag.RowReduction(A,backend=backend)),
+                     TimeCall(lambda: lag.FullRowReduction(A,backend=backend)),
+                     TimeCall(lambda: lag.BackSubstitution(U,A[:,n],backend=backend),repeat=3))
+            print("%6d %8s %12.4f %12.4f %12.4f" % ((n,lag.ActiveBackend(backend)) + times))
+
+def CheckBackends(trials = 200):
+    '''
+    CheckBackends(trials = 200)
+
+    Checks on random matrices, including rank deficient ones, that the 
+    'numpy' and 'numba' backends give identical results for RowReduction,
+    FullRowReduction and LUFactorization, and results that agree to 
+    roundoff for BackSubstitution and ForwardSubstitution.  Prints and 
+    returns the number of mismatches.  With --check-backends the script 
+    exits with status 1 if there are any, so that a divergence between the
+    backends fails the run.
+    '''
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    for t in range(trials):
+        m = rng.integers(1,8)
+        n = rng.integers(1,9)
+        if (t%2 == 0):
+            A = rng.integers(-3,4,(m,n)).astype('float64')
+        else:
+            A = rng.standard_normal((m,n))
+        for pivoting in (False,True):
+            results = [lag.FullRowReduction(A,pivoting=pivoting,backend=backend)
+                       for backend in ('numpy','numba')]
+            mismatches += not np.array_equal(results[0],results[1])
+            if (n >= m):
+                # Messages about missing pivots are compared, not printed
+                messages = []
+                results = []
+                for backend in ('numpy','numba'):
+                    with contextlib.redirect_stdout(io.StringIO()) as output:
+                        results.append(lag.RowReduction(A,pivoting,backend=backend))
+                    messages.append(output.getvalue())
+                mismatches += not (np.array_equal(results[0],results[1]) and
+                                   messages[0] == messages[1])
+        if (m == n):
+            factors = []
+            for backend in ('numpy','numba'):
+                B = np.array(A)
+                L = np.zeros((m,m))
+                perm = np.arange(m)
+                lag.Elimination(B,pivoting=True,L=L,perm=perm,backend=backend)
+                factors.append((B,L,perm))
+            mismatches += not all(np.array_equal(factors[0][i],factors[1][i]) 
+                                  for i in range(3))
+            U = np.triu(A) + 10*np.eye(m)
+            for Substitution, T in ((lag.BackSubstitution,U),
+                                    (lag.ForwardSubstitution,U.transpose())):
+                results = [Substitution(T,A,backend=backend) 
+                           for backend in ('numpy','numba')]
+                mismatches += not np.allclose(results[0],results[1],rtol=1e-12)
+    print("Backend mismatches:",mismatches)
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for laguide.")
+    parser.add_argument('--suite',action='store_true',
+                        help="run the suite and check for regressions")
+    parser.add_argument('--quick',action='store_true',help="use smaller sizes")
+    parser.add_argument('--history',default='laguide_benchmarks.json')
+    parser.add_argument('--threshold',type=float,default=1.25)
+    parser.add_argument('--baseline',action='store_true',
+                        help="make this run the new baseline")
+    parser.add_argument('--check-backends',action='store_true',
+                        help="check that the backends agree, exit 1 if not")
+    options = parser.parse_args()
+    
+    if (options.check_backends):
+        mismatches = CheckBackends()
+        sys.exit(1 if mismatches else 0)
+    
+    if (options.suite):
+        regressions = BenchmarkSuite(options.history,options.quick,
+                                     options.threshold,options.baseline)
+        sys.exit(1 if regressions else 0)
+    
+    BenchmarkRowReduction()
+    BenchmarkLUSolves()
+    BenchmarkBatchSolve()
+    BenchmarkHillCipher()
+    BenchmarkBackends()
+    BenchmarkScaling()